@@ -0,0 +1,186 @@
+"""Player leaderboard ranked by rating, from the users table or a Redis sorted set (LEADERBOARD_BACKEND)."""
+import logging
+import uuid
+from base64 import b64decode, b64encode
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from redis.exceptions import RedisError
+from utils.conditional import rotate_tokens
+from utils.custom_pagination import paginated_count
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'leaderboard:version'
+
+
+def _ranked(users, first_rank):
+    for rank, user in enumerate(users, start=first_rank):
+        user.rank = rank
+    return users
+
+
+class DatabaseLeaderboard:
+    def players(self):
+        return get_user_model().objects.filter(is_bot=False).order_by('-rating', '-id')
+
+    def count(self):
+        return paginated_count(self.players())
+
+    def page(self, offset, limit):
+        """Users at positions offset .. offset + limit - 1, each with a .rank"""
+        return _ranked(list(self.players()[offset:offset + limit]), offset + 1)
+
+    def after(self, rating, user_id, rank, limit):
+        """Up to `limit` users ranked right below the one at (rating, user_id, rank), without an OFFSET scan"""
+        players = self.players().filter(Q(rating__lt=rating) | Q(rating=rating, id__lt=user_id))
+        return _ranked(list(players[:limit]), rank + 1)
+
+    def rank(self, user):
+        if user.is_bot:
+            return None
+        above = self.players().filter(
+            Q(rating__gt=user.rating) | Q(rating=user.rating, id__gt=user.id)
+        ).count()
+        return above + 1
+
+    def around(self, user, radius):
+        """The user and up to `radius` players on either side, each with a .rank"""
+        rank = self.rank(user)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        return self.page(start, rank - 1 - start + radius + 1)
+
+    def record(self, ratings):
+        """Note new {user_id: rating} values (the users table is the leaderboard here)"""
+        rotate_tokens(VERSION_KEY)
+
+    def rebuild(self):
+        rotate_tokens(VERSION_KEY)
+        return self.count()
+
+
+class RedisLeaderboard(DatabaseLeaderboard):
+    KEY = 'leaderboard:rating'
+    REBUILD_CHUNK = 10000
+    REBUILD_LOCK_TIMEOUT = 300
+
+    def _loaded(self):
+        """Whether the sorted set can be read; a missing set is rebuilt by the first caller to notice"""
+        redis = get_redis()
+        if redis.exists(self.KEY):
+            return True
+        lock = f'{self.KEY}:rebuilding'
+        if not redis.set(lock, 1, nx=True, ex=self.REBUILD_LOCK_TIMEOUT):
+            return False
+        try:
+            logger.warning(f"Leaderboard {self.KEY} missing, rebuilding it")
+            return self.rebuild() > 0
+        finally:
+            redis.delete(lock)
+
+    def count(self):
+        if not self._loaded():
+            return super().count()
+        return get_redis().zcard(self.KEY)
+
+    def _users(self, entries, first_rank):
+        ids = [uuid.UUID(member.decode()) for member, _ in entries]
+        users = get_user_model().objects.in_bulk(ids)
+        # Position comes from the sorted set; users deleted since are skipped
+        return _ranked([users[user_id] for user_id in ids if user_id in users], first_rank)
+
+    def page(self, offset, limit):
+        if not self._loaded():
+            return super().page(offset, limit)
+        entries = get_redis().zrevrange(self.KEY, offset, offset + limit - 1, withscores=True)
+        return self._users(entries, offset + 1)
+
+    def after(self, rating, user_id, rank, limit):
+        # Offsets into a sorted set are O(log n) already
+        return self.page(rank, limit)
+
+    def rank(self, user):
+        if not self._loaded():
+            return super().rank(user)
+        position = get_redis().zrevrank(self.KEY, str(user.id))
+        return None if position is None else position + 1
+
+    def around(self, user, radius):
+        if not self._loaded():
+            return super().around(user, radius)
+        rank = self.rank(user)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        entries = get_redis().zrevrange(self.KEY, start, rank - 1 + radius, withscores=True)
+        return self._users(entries, start + 1)
+
+    def record(self, ratings):
+        # Derived data: a missed write is repaired by the next rebuild, never fails the caller
+        try:
+            redis = get_redis()
+            # Writing to a missing set would leave it holding only these players; the rebuild loads them
+            if redis.exists(self.KEY):
+                redis.zadd(self.KEY, {str(user_id): rating for user_id, rating in ratings.items()})
+        except RedisError as e:
+            logger.warning(f"Leaderboard update failed for {list(ratings)}: {e}")
+        rotate_tokens(VERSION_KEY)
+
+    def rebuild(self):
+        """Reload every human player's rating into a fresh set, then swap it in atomically"""
+        redis = get_redis()
+        staging = f'{self.KEY}:rebuild'
+        redis.delete(staging)
+        total = 0
+        chunk = {}
+        for user_id, rating in self.players().values_list('id', 'rating').iterator():
+            chunk[str(user_id)] = rating
+            if len(chunk) == self.REBUILD_CHUNK:
+                redis.zadd(staging, chunk)
+                total += len(chunk)
+                chunk = {}
+        if chunk:
+            redis.zadd(staging, chunk)
+            total += len(chunk)
+        if total:
+            redis.rename(staging, self.KEY)
+        else:
+            redis.delete(self.KEY)
+        rotate_tokens(VERSION_KEY)
+        return total
+
+
+class LeaderboardEntries:
+    """Lazy ranked sequence of a leaderboard, for Django's Paginator"""
+
+    def __init__(self, leaderboard):
+        self.leaderboard = leaderboard
+
+    def count(self):
+        return self.leaderboard.count()
+
+    def cursor(self, user):
+        """Opaque position of a listed user, for after()"""
+        return b64encode(f'{user.rating}|{user.id}|{user.rank}'.encode(), altchars=b'-_').decode()
+
+    def after(self, cursor, limit):
+        """The page following a cursor() position; ValueError for a malformed cursor"""
+        rating, user_id, rank = b64decode(cursor.encode(), altchars=b'-_').decode().split('|')
+        return self.leaderboard.after(int(rating), uuid.UUID(user_id), int(rank), limit)
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        return self.leaderboard.page(start, stop - start)
+
+
+BACKENDS = {
+    'database': DatabaseLeaderboard,
+    'redis': RedisLeaderboard,
+}
+
+
+def get_leaderboard():
+    return BACKENDS[settings.LEADERBOARD_BACKEND]()
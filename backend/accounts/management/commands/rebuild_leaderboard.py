@@ -0,0 +1,14 @@
+import time
+from django.core.management.base import BaseCommand
+from accounts.leaderboard import get_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Reload the leaderboard from the users table (LEADERBOARD_BACKEND=redis)"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        ranked = get_leaderboard().rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Leaderboard rebuilt with {ranked} players in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,76 @@
+"""JWT authentication for WebSocket connections: ?token= becomes a cached Principal in scope['user']."""
+import logging
+import uuid
+from collections import namedtuple
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .tokens import PRINCIPAL_CLAIMS
+
+logger = logging.getLogger(__name__)
+
+
+class Principal(namedtuple('Principal', ('id',) + PRINCIPAL_CLAIMS)):
+    """An authenticated socket user; load the User row where a model instance is needed"""
+    __slots__ = ()
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def pk(self):
+        return self.id
+
+
+def principal_key(user_id):
+    return f'ws:principal:{user_id}'
+
+
+def load_principal(user_id):
+    """Principal for a user id from the cache or the users table (sync); None if unknown"""
+    key = principal_key(user_id)
+    claims = cache.get(key)
+    if claims is None:
+        claims = (
+            get_user_model().objects.filter(id=user_id, is_active=True)
+            .values_list(*PRINCIPAL_CLAIMS).first()
+        )
+        if claims is None:
+            return None
+        cache.set(key, claims, settings.WS_PRINCIPAL_CACHE_TTL)
+    return Principal(user_id, *claims)
+
+
+async def get_principal(raw_token):
+    """Principal for a raw access token; raises TokenError if it is not acceptable"""
+    token = AccessToken(raw_token)
+    try:
+        user_id = uuid.UUID(str(token[api_settings.USER_ID_CLAIM]))
+    except (KeyError, ValueError):
+        raise TokenError('Token has no valid user id')
+    # Claims alone would outlive a deactivation, so every token goes through the cached active-user lookup
+    principal = await database_sync_to_async(load_principal)(user_id)
+    if principal is None:
+        raise TokenError('User not found or inactive')
+    return principal
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        raw_token = query.get('token', [None])[0]
+        scope['user'] = AnonymousUser()
+        if raw_token:
+            try:
+                scope['user'] = await get_principal(raw_token)
+            except TokenError as e:
+                logger.warning(f"Rejected JWT token in WebSocket connection: {e}")
+                scope['auth_error'] = str(e)
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_alter_user_options_alter_user_managers_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="is_bot",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_user_is_bot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="rating_deviation",
+            field=models.FloatField(default=350.0),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="rating_volatility",
+            field=models.FloatField(default=0.06),
+        ),
+    ]
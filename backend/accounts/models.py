@@ -8,6 +8,10 @@ class User(AbstractUser):
     losses = models.IntegerField(default=0)
     draws = models.IntegerField(default=0)
     rating = models.IntegerField(default=1000)
+    # Glicko-2 state, used when RATING_ENGINE is "glicko2" (see game.ratings)
+    rating_deviation = models.FloatField(default=350.0)
+    rating_volatility = models.FloatField(default=0.06)
+    is_bot = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-rating']
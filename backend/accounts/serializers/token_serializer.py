@@ -0,0 +1,6 @@
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from accounts.tokens import PrincipalRefreshToken
+
+
+class PrincipalTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = PrincipalRefreshToken
@@ -10,3 +10,19 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'wins', 'losses', 'draws', 'rating', 
                   'total_games', 'win_rate']
         read_only_fields = ['id', 'wins', 'losses', 'draws', 'rating']
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Identity only, for compact listings"""
+
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class RankedUserSerializer(UserSerializer):
+    """A leaderboard entry: the user plus their position"""
+    rank = serializers.IntegerField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
+        fields = ['rank'] + UserSerializer.Meta.fields
@@ -1,3 +1,224 @@
-from django.test import TestCase
+from unittest import skipUnless
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from redis.exceptions import RedisError
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from utils.redis_client import get_redis
+from .leaderboard import DatabaseLeaderboard, RedisLeaderboard, get_leaderboard
+from .middleware import JWTAuthMiddleware, principal_key
+from .models import User
+from .tokens import PrincipalRefreshToken
 
-# Create your tests here.
+
+def redis_available():
+    try:
+        return get_redis().ping()
+    except RedisError:
+        return False
+
+
+class LeaderboardTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # Two players share a rating to exercise the id tie-break
+        for i, rating in enumerate([1200, 1100, 1100, 1000, 900]):
+            User.objects.create_user(username=f'ranked{i}', password='testpass123', rating=rating)
+        User.objects.create_user(username='bot', password='testpass123', rating=5000, is_bot=True)
+        self.expected = list(User.objects.filter(is_bot=False).order_by('-rating', '-id'))
+
+    def test_leaderboard_pages_are_ranked(self):
+        """Test leaderboard pages list humans by rating with their rank"""
+        response = self.client.get(reverse('accounts:leaderboard'), {'page': 2, 'page_size': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(
+            [(entry['rank'], entry['username']) for entry in response.data['results']],
+            [(3, self.expected[2].username), (4, self.expected[3].username)]
+        )
+
+    def test_leaderboard_count_is_cached(self):
+        """Test paging through the leaderboard counts the players once"""
+        url = reverse('accounts:leaderboard')
+        self.client.get(url, {'page_size': 2})
+        User.objects.create_user(username='newcomer', password='testpass123')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'page': 2, 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+
+        with override_settings(PAGINATION_COUNT_TTL=0):
+            response = self.client.get(url, {'page': 2, 'page_size': 2})
+        self.assertEqual(response.data['count'], 6)
+
+    def test_leaderboard_without_count(self):
+        """Test count=false pages by links alone without counting"""
+        url = reverse('accounts:leaderboard')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'page': 2, 'page_size': 2, 'count': 'false'})
+
+        self.assertNotIn('count', response.data)
+        self.assertEqual([entry['rank'] for entry in response.data['results']], [3, 4])
+        self.assertIn('cursor=', response.data['next'])
+        self.assertNotIn('page=', response.data['previous'])
+
+        response = self.client.get(url, {'page': 3, 'page_size': 2, 'count': 'false'})
+        self.assertEqual([entry['rank'] for entry in response.data['results']], [5])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(url, {'page': 'x', 'count': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_leaderboard_cursor_pages(self):
+        """Test count=false follows cursors past the first page, keeping ranks"""
+        url = reverse('accounts:leaderboard')
+        response = self.client.get(url, {'page_size': 2, 'count': 'false'})
+        seen = response.data['results']
+        while response.data['next']:
+            with self.assertNumQueries(1):
+                response = self.client.get(response.data['next'])
+            self.assertIsNone(response.data['previous'])
+            seen += response.data['results']
+
+        self.assertEqual(
+            [(entry['rank'], entry['username']) for entry in seen],
+            [(rank, user.username) for rank, user in enumerate(self.expected, start=1)]
+        )
+        response = self.client.get(url, {'cursor': 'x', 'count': 'false'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_leaderboard_conditional_get(self):
+        """Test the leaderboard answers 304 until a rating is recorded"""
+        url = reverse('accounts:leaderboard')
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        get_leaderboard().record({self.expected[4].id: 1300})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_my_rank_and_players_around_me(self):
+        """Test the rank endpoint returns the user's position and neighbours"""
+        user = self.expected[3]
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('accounts:leaderboard-rank'), {'radius': 1})
+
+        self.assertEqual(response.data['rank'], 4)
+        self.assertEqual(response.data['total'], 5)
+        self.assertEqual([entry['rank'] for entry in response.data['around']], [3, 4, 5])
+        self.assertEqual(response.data['around'][1]['username'], user.username)
+
+        self.client.force_authenticate(user=User.objects.get(is_bot=True))
+        response = self.client.get(reverse('accounts:leaderboard-rank'))
+        self.assertEqual((response.data['rank'], response.data['around']), (None, []))
+
+
+class JWTAuthMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='socket', password='testpass123')
+        cache.delete(principal_key(self.user.id))
+        # Issued up front: refresh tokens are recorded for the blacklist, which is sync only
+        self.token = PrincipalRefreshToken.for_user(self.user).access_token
+        self.token_without_claims = AccessToken.for_user(self.user)
+
+    def scope_for(self, query_string):
+        scopes = []
+
+        async def app(scope, receive, send):
+            scopes.append(scope)
+
+        middleware = JWTAuthMiddleware(app)
+        async_to_sync(middleware)({'type': 'websocket', 'query_string': query_string}, None, None)
+        return scopes[0]
+
+    def test_principal_from_token_claims(self):
+        """Test tokens issued at login authenticate a socket with one cached user query"""
+        query_string = f'seq=3&token={self.token}'.encode()
+        with self.assertNumQueries(1):
+            self.scope_for(query_string)
+        with self.assertNumQueries(0):
+            scope = self.scope_for(query_string)
+
+        self.assertEqual(scope['user'], (self.user.id, 'socket', False))
+        self.assertTrue(scope['user'].is_authenticated)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test a token carrying claims no longer authenticates a deactivated user"""
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        scope = self.scope_for(f'token={self.token}'.encode())
+
+        self.assertFalse(scope['user'].is_authenticated)
+        self.assertIn('auth_error', scope)
+
+    def test_principal_for_older_tokens_is_cached(self):
+        """Test tokens without claims look the user up once, then hit the cache"""
+        query_string = f'token={self.token_without_claims}'.encode()
+        with self.assertNumQueries(1):
+            self.scope_for(query_string)
+        with self.assertNumQueries(0):
+            scope = self.scope_for(query_string)
+
+        self.assertEqual(scope['user'].username, 'socket')
+
+    def test_missing_and_rejected_tokens(self):
+        """Test a missing token is anonymous and a bad one is flagged for the consumer"""
+        scope = self.scope_for(b'')
+        self.assertFalse(scope['user'].is_authenticated)
+        self.assertNotIn('auth_error', scope)
+
+        scope = self.scope_for(b'token=not-a-jwt')
+        self.assertFalse(scope['user'].is_authenticated)
+        self.assertIn('auth_error', scope)
+
+    def test_login_issues_tokens_with_claims(self):
+        """Test login access tokens carry the username and bot flag"""
+        response = self.client.post(reverse('accounts:login'), {'username': 'socket', 'password': 'testpass123'})
+        token = AccessToken(response.json()['access'])
+
+        self.assertEqual((token['username'], token['is_bot']), ('socket', False))
+
+
+@skipUnless(redis_available(), 'Redis is not reachable at REDIS_URL')
+class RedisLeaderboardTestCase(TestCase):
+    def setUp(self):
+        for i, rating in enumerate([1200, 1100, 1100, 1000, 900]):
+            User.objects.create_user(username=f'ranked{i}', password='testpass123', rating=rating)
+        self.leaderboard = RedisLeaderboard()
+        self.leaderboard.KEY = 'test:leaderboard:rating'
+        self.leaderboard.rebuild()
+
+    def tearDown(self):
+        get_redis().delete(self.leaderboard.KEY)
+
+    def test_matches_database_ranking(self):
+        """Test the sorted set ranks exactly like the database"""
+        database = DatabaseLeaderboard()
+
+        self.assertEqual(self.leaderboard.count(), 5)
+        self.assertEqual(self.leaderboard.page(1, 3), database.page(1, 3))
+        for user in database.players():
+            self.assertEqual(self.leaderboard.rank(user), database.rank(user))
+            self.assertEqual(self.leaderboard.around(user, 2), database.around(user, 2))
+
+    def test_record_moves_player(self):
+        """Test a recorded rating change moves the player"""
+        user = User.objects.get(username='ranked4')
+        self.leaderboard.record({user.id: 1300})
+
+        self.assertEqual(self.leaderboard.rank(user), 1)
+
+    def test_missing_set_is_rebuilt_on_read(self):
+        """Test a flushed sorted set is reloaded from the database by the next read"""
+        get_redis().delete(self.leaderboard.KEY)
+        user = User.objects.get(username='ranked4')
+        self.leaderboard.record({user.id: 1300})
+
+        self.assertEqual(self.leaderboard.rank(user), 5)
+        self.assertEqual(self.leaderboard.count(), 5)
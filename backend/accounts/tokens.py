@@ -0,0 +1,14 @@
+"""JWT tokens carrying the user fields a WebSocket principal holds (see accounts.middleware)."""
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# User fields copied into tokens, in addition to the user id
+PRINCIPAL_CLAIMS = ('username', 'is_bot')
+
+
+class PrincipalRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in PRINCIPAL_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
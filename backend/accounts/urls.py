@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import RegisterView, CurrentUserView, LeaderboardView
+from .views import RegisterView, CurrentUserView, LeaderboardView, LeaderboardRankView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 app_name = "accounts"
@@ -10,4 +10,5 @@ urlpatterns = [
     path("refresh/", TokenRefreshView.as_view(), name="refresh"),
     path("me/", CurrentUserView.as_view(), name="me"),
     path("leaderboard/", LeaderboardView.as_view(), name="leaderboard"),
+    path("leaderboard/me/", LeaderboardRankView.as_view(), name="leaderboard-rank"),
 ]
@@ -1,12 +1,15 @@
 # users/views.py
 import logging
-from rest_framework import generics, permissions, status
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiParameter
 from .models import User
 from accounts.serializers.user_registeration_serializer import RegisterSerializer
-from accounts.serializers.user_serializer import UserSerializer
+from accounts.serializers.user_serializer import RankedUserSerializer, UserSerializer
+from .tokens import PrincipalRefreshToken
+from .leaderboard import VERSION_KEY, LeaderboardEntries, get_leaderboard
+from utils.conditional import add_validators, get_token, not_modified, weak_etag
 from utils.custom_pagination import CustomPagination
 
 logger = logging.getLogger(__name__)
@@ -39,8 +42,9 @@ class RegisterView(generics.CreateAPIView):
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             user = serializer.save()
+            get_leaderboard().record({user.id: user.rating})
 
-            refresh = RefreshToken.for_user(user)
+            refresh = PrincipalRefreshToken.for_user(user)
             logger.info(f"New user registered: {user.username}")
             return Response({
                 'user': UserSerializer(user).data,
@@ -74,9 +78,8 @@ class CurrentUserView(generics.RetrieveAPIView):
 
 
 class LeaderboardView(generics.ListAPIView):
-    """Paginated leaderboard view — automatically ordered by '-rating'."""
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
+    """Paginated leaderboard, highest rating first, served by the leaderboard backend. Bots are excluded."""
+    serializer_class = RankedUserSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = CustomPagination
 
@@ -96,11 +99,68 @@ class LeaderboardView(generics.ListAPIView):
                 location=OpenApiParameter.QUERY,
                 description='Number of items per page'
             ),
+            OpenApiParameter(
+                name='count',
+                type=bool,
+                location=OpenApiParameter.QUERY,
+                description='Set to false to skip the total: only next / previous links are returned, '
+                            'and next pages by cursor'
+            ),
+            OpenApiParameter(
+                name='cursor',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description='Position from a count=false `next` link'
+            ),
         ],
         responses={
-            200: UserSerializer(many=True),
+            200: RankedUserSerializer(many=True),
+            304: {"description": "Not modified since the ETag in If-None-Match"},
         },
         tags=['Users']
     )
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+        etag = weak_etag(get_token(VERSION_KEY), request.get_full_path())
+        return not_modified(request, etag) or add_validators(super().get(request, *args, **kwargs), etag)
+
+    def get_queryset(self):
+        return LeaderboardEntries(get_leaderboard())
+
+
+class LeaderboardRankView(APIView):
+    """The authenticated user's leaderboard rank and the players around them"""
+    permission_classes = [permissions.IsAuthenticated]
+    max_radius = 50
+
+    @extend_schema(
+        summary="Get my leaderboard rank",
+        description="Rank of the authenticated user plus up to `radius` players above and below. "
+                    "rank is null for unranked users (bots).",
+        parameters=[
+            OpenApiParameter(
+                name='radius',
+                type=int,
+                location=OpenApiParameter.QUERY,
+                description='Players to include on each side (default 5, max 50)'
+            ),
+        ],
+        responses={
+            200: inline_serializer(name='LeaderboardRank', fields={
+                'rank': serializers.IntegerField(allow_null=True),
+                'total': serializers.IntegerField(),
+                'around': RankedUserSerializer(many=True),
+            }),
+        },
+        tags=['Users']
+    )
+    def get(self, request):
+        try:
+            radius = min(max(int(request.query_params.get('radius', 5)), 0), self.max_radius)
+        except ValueError:
+            return Response({'error': 'radius must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        leaderboard = get_leaderboard()
+        return Response({
+            'rank': leaderboard.rank(request.user),
+            'total': leaderboard.count(),
+            'around': RankedUserSerializer(leaderboard.around(request.user, radius), many=True).data,
+        })
@@ -0,0 +1,282 @@
+"""Per-game actors: the owner applies a game's moves in order; other workers forward to it."""
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque, namedtuple
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from accounts.middleware import Principal
+from .bot import choose_move
+from .broadcast import game_state_message, move_applied_message
+from .event_log import event_log
+from .models import Game
+from .ownership import is_local, owner_of, worker_channel
+from .state_store import MoveError, store
+
+logger = logging.getLogger(__name__)
+
+MoveCommand = namedtuple('MoveCommand', ['user', 'position', 'reply_channel'])
+StateCommand = namedtuple('StateCommand', ['reply_channel'])
+ResumeCommand = namedtuple('ResumeCommand', ['reply_channel', 'last_seq'])
+BotTurnCommand = namedtuple('BotTurnCommand', ['bot'])
+
+
+@database_sync_to_async
+def stored_game_state_message(game_id):
+    try:
+        game = Game.objects.select_related(
+            'player1', 'player2', 'current_turn', 'winner'
+        ).get(id=game_id)
+        return game_state_message(game)
+    except Game.DoesNotExist:
+        return json.dumps({'type': 'game_state', 'game': None})
+
+
+async def queue_bot_turn(game_id):
+    """Load a game into memory; if it was stored with the bot to move (e.g. before a restart), queue the bot's move"""
+    if store.get(game_id) is not None:
+        return
+    try:
+        live = await store.aload(game_id)
+    except Game.DoesNotExist:
+        return
+    if live is not None and live.current_turn.is_bot:
+        actor_for(game_id).submit(BotTurnCommand(live.current_turn))
+
+
+async def local_game_state_message(game_id):
+    """Encoded game_state from this process's live game, or the database"""
+    await queue_bot_turn(game_id)
+    live = store.get(game_id)
+    if live is not None:
+        return game_state_message(live)
+    return await stored_game_state_message(game_id)
+
+
+async def local_resume_messages(game_id, last_seq):
+    """Encoded events after last_seq from this process's event log, or a game_state snapshot"""
+    await queue_bot_turn(game_id)
+    live = store.get(game_id)
+    events = event_log.since(live.id, last_seq, live.version) if live else None
+    if events is None:
+        logger.info(f"Resume from seq {last_seq} not in event log for game {game_id}; sending snapshot")
+        return [await local_game_state_message(game_id)]
+    return events
+
+
+class GameActor:
+    """Queue of one game's moves, drained by a single task"""
+
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.game_group_name = f'game_{game_id}'
+        self.queue = deque()
+        self.task = None
+
+    def submit(self, command):
+        self.queue.append(command)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.drain())
+
+    async def drain(self):
+        while self.queue:
+            command = self.queue.popleft()
+            try:
+                await self.handle(command)
+            except Exception as e:
+                logger.error(f"Move handling failed for game {self.game_id}: {e}", exc_info=True)
+        if actors.get(self.game_id) is self:
+            del actors[self.game_id]
+
+    async def handle(self, command):
+        if isinstance(command, StateCommand):
+            await get_channel_layer().send(command.reply_channel, {
+                'type': 'game_update',
+                'text': await local_game_state_message(self.game_id)
+            })
+            return
+        if isinstance(command, ResumeCommand):
+            channel_layer = get_channel_layer()
+            for text in await local_resume_messages(self.game_id, command.last_seq):
+                await channel_layer.send(command.reply_channel, {'type': 'game_update', 'text': text})
+            return
+        if isinstance(command, BotTurnCommand):
+            await self.play_bot(command.bot)
+            return
+
+        result = await self.process_move(command.user, command.position)
+        await self.broadcast_move_result(result, command.reply_channel)
+
+        # Reply for the bot through the same move path
+        bot = result.get('bot_to_move')
+        if bot:
+            await self.play_bot(bot)
+
+    async def play_bot(self, bot):
+        live = store.get(self.game_id)
+        if live is None or live.status != 'in_progress' or live.current_turn.id != bot.id:
+            return
+        position = choose_move(live.x_mask, live.o_mask)
+        logger.info(f"Bot {bot.username} playing position {position} in game {self.game_id}")
+        await self.broadcast_move_result(await self.process_move(bot, position), None)
+
+    async def broadcast_move_result(self, result, reply_channel):
+        channel_layer = get_channel_layer()
+        if result['success']:
+            logger.info(f"Move successful for game {self.game_id}, broadcasting to group {self.game_group_name}")
+            event_log.record(self.game_id, result['seq'], result['message'])
+            # Broadcast to all players in game
+            await channel_layer.group_send(
+                self.game_group_name,
+                {
+                    'type': 'game_update',
+                    'text': result['message']
+                }
+            )
+        else:
+            logger.warning(f"Move failed for game {self.game_id}: {result['error']}")
+            if reply_channel:
+                await channel_layer.send(reply_channel, {'type': 'move_error', 'message': result['error']})
+
+    async def process_move(self, user, position):
+        try:
+            # Served from memory; the database is only read the first time a game is touched
+            live = await store.aload(self.game_id)
+            if live is None:
+                logger.warning(f"Move attempted on game {self.game_id} which is not in progress")
+                return {'success': False, 'error': 'Game is not in progress'}
+
+            logger.info(f"Player {user.username} making move at position {position} in game {live.id}")
+            try:
+                pending = store.apply_move(live, user.id, position)
+            except MoveError as e:
+                logger.warning(f"Move rejected for game {live.id}: {e}")
+                return {'success': False, 'error': str(e)}
+
+            if live.status == 'finished':
+                # Final synchronous flush: result and stats are persisted before they are announced
+                try:
+                    await store.aflush()
+                except Exception as e:
+                    # The move stands and the batch is queued again; retry it in the background
+                    logger.error(f"Final flush failed for game {live.id}, retrying: {e}", exc_info=True)
+                    store.schedule_flush(pending)
+                logger.info(f"Game {live.id} finished with result {live.result}")
+            else:
+                store.schedule_flush(pending)
+
+            return {
+                'success': True,
+                'seq': live.version,
+                'message': move_applied_message(live),
+                'bot_to_move': live.current_turn if (
+                    live.status == 'in_progress' and live.current_turn.is_bot
+                ) else None
+            }
+
+        except Game.DoesNotExist:
+            logger.error(f"Game not found: {self.game_id}")
+            return {'success': False, 'error': 'Game not found'}
+        except Exception as e:
+            logger.error(f"Exception in process_move for game {self.game_id}: {e}", exc_info=True)
+            return {'success': False, 'error': 'Internal server error'}
+
+
+# Actors with queued moves in this process, by game id
+actors = {}
+
+
+def actor_for(game_id):
+    actor = actors.get(game_id)
+    if actor is None:
+        actor = actors[game_id] = GameActor(game_id)
+    return actor
+
+
+async def submit_move(game_id, user, position, reply_channel):
+    """Queue a move with the game's owner: the local actor, or the owning worker's channel"""
+    if is_local(game_id):
+        actor_for(game_id).submit(MoveCommand(user, position, reply_channel))
+        return
+    await get_channel_layer().send(worker_channel(owner_of(game_id)), {
+        'type': 'game.move',
+        'game_id': str(game_id),
+        'user': [str(user.id), user.username, user.is_bot],
+        'position': position,
+        'reply_channel': reply_channel,
+    })
+
+
+async def request_game_state(game_id, reply_channel):
+    """Ask the game's owner to send a game_state snapshot to reply_channel"""
+    if is_local(game_id):
+        actor_for(game_id).submit(StateCommand(reply_channel))
+        return
+    await get_channel_layer().send(worker_channel(owner_of(game_id)), {
+        'type': 'game.state',
+        'game_id': str(game_id),
+        'reply_channel': reply_channel,
+    })
+
+
+async def request_resume(game_id, last_seq, reply_channel):
+    """Ask the game's owner to send reply_channel the events after last_seq, or a snapshot"""
+    if is_local(game_id):
+        actor_for(game_id).submit(ResumeCommand(reply_channel, last_seq))
+        return
+    await get_channel_layer().send(worker_channel(owner_of(game_id)), {
+        'type': 'game.resume',
+        'game_id': str(game_id),
+        'reply_channel': reply_channel,
+        'last_seq': last_seq,
+    })
+
+
+async def listen():
+    """Apply moves and answer state and resume requests forwarded to this worker by the others"""
+    channel_layer = get_channel_layer()
+    channel = worker_channel(settings.GAME_WORKER_ID)
+    logger.info(f"Listening for forwarded game commands on {channel}")
+    while True:
+        message = await channel_layer.receive(channel)
+        if message.get('type') == 'game.move':
+            user_id, username, is_bot = message['user']
+            command = MoveCommand(
+                Principal(uuid.UUID(user_id), username, is_bot), message['position'], message['reply_channel']
+            )
+        elif message.get('type') == 'game.state':
+            command = StateCommand(message['reply_channel'])
+        elif message.get('type') == 'game.resume':
+            command = ResumeCommand(message['reply_channel'], message['last_seq'])
+        else:
+            continue
+        actor_for(uuid.UUID(message['game_id'])).submit(command)
+
+
+_listener = None
+
+
+def start_listener():
+    """Start listen() on the running loop once, if this process is one of several workers"""
+    global _listener
+    if not settings.GAME_WORKER_ID or not settings.GAME_WORKERS:
+        return
+    loop = asyncio.get_running_loop()
+    if _listener is None or _listener.done() or _listener.get_loop() is not loop:
+        _listener = loop.create_task(listen())
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan app: listen from startup, flush live games on shutdown"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_listener()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await store.aflush()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
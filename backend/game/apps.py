@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class GameConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "game"
+
+    def ready(self):
+        # Solve every reachable 3x3 position once so bot moves are O(1) lookups
+        from .solver import get_table
+        get_table()
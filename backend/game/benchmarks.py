@@ -0,0 +1,198 @@
+"""Microbenchmarks for the game hot paths, run and compared to a JSON baseline by `manage.py benchmark`."""
+import asyncio
+import inspect
+import platform
+import statistics
+import time
+from collections import namedtuple
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from .actors import GameActor
+from .broadcast import _build
+from .models import Game, Move
+from .serializer import GameSerializer, with_game_details
+from .state_store import store
+from .game_logic import BitBoard, TicTacToeLogic, get_geometry
+
+DEFAULT_MAX_REGRESSION = 10  # percent
+
+# Reference results kept with the code; only comparable on the machine that recorded them
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+
+Benchmark = namedtuple('Benchmark', ['name', 'setup', 'number', 'database'])
+
+BENCHMARKS = {}
+
+
+def benchmark(name, number, database=False):
+    """Register a setup function; `database` benchmarks need a (test) database"""
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, number, database)
+        return setup
+    return register
+
+
+def run_benchmark(bench, rounds):
+    times = []
+    for _ in range(rounds):
+        target = bench.setup(bench.number)
+        if inspect.iscoroutinefunction(target):
+            elapsed = asyncio.run(_time_async(target, bench.number))
+        else:
+            started = time.perf_counter()
+            for _ in range(bench.number):
+                target()
+            elapsed = time.perf_counter() - started
+        times.append(elapsed / bench.number * 1e6)
+    return {
+        'number': bench.number,
+        'rounds': rounds,
+        'min_us': round(min(times), 3),
+        'median_us': round(statistics.median(times), 3),
+        'mean_us': round(statistics.fmean(times), 3),
+    }
+
+
+async def _time_async(target, number):
+    started = time.perf_counter()
+    for _ in range(number):
+        await target()
+    return time.perf_counter() - started
+
+
+def run_benchmarks(benchmarks, rounds):
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': {bench.name: run_benchmark(bench, rounds) for bench in benchmarks},
+    }
+
+
+def compare(baseline, results, max_regression=DEFAULT_MAX_REGRESSION):
+    """[(name, baseline median, current median, change %, regressed)] for benchmarks in both runs"""
+    rows = []
+    for name, current in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            continue
+        change = (current['median_us'] / base['median_us'] - 1) * 100
+        rows.append((name, base['median_us'], current['median_us'], round(change, 1), change > max_regression))
+    return rows
+
+
+# Game logic
+
+UNDECIDED_BOARD = [['X', 'O', 'X'], ['X', 'O', 'O'], ['O', 'X', 'X']]
+NEARLY_FULL_BOARD = [['X', 'O', 'X'], ['X', 'O', 'O'], ['O', 'X', None]]
+
+
+@benchmark('TicTacToeLogic.check_winner', number=100_000)
+def list_check_winner(number):
+    # No line wins, so every row, column and diagonal is inspected
+    return lambda: TicTacToeLogic.check_winner(UNDECIDED_BOARD)
+
+
+@benchmark('TicTacToeLogic.is_board_full', number=100_000)
+def list_is_board_full(number):
+    # The only empty cell is the last one scanned
+    return lambda: TicTacToeLogic.is_board_full(NEARLY_FULL_BOARD)
+
+
+@benchmark('BitBoard.check_winner', number=1_000_000)
+def bitboard_check_winner(number):
+    x_mask, o_mask = BitBoard.from_board(UNDECIDED_BOARD)
+    return lambda: BitBoard.check_winner(x_mask, o_mask)
+
+
+@benchmark('BoardGeometry.is_win_at 3x3', number=1_000_000)
+def geometry_is_win_at(number):
+    # The move path's check: O's centre stone lies on four lines, none complete
+    geometry = get_geometry(3, 3)
+    _, o_mask = geometry.from_board(UNDECIDED_BOARD)
+    return lambda: geometry.is_win_at(o_mask, 4)
+
+
+@benchmark('BoardGeometry.is_win_at 15x15', number=200_000)
+def gomoku_is_win_at(number):
+    # Centre of a gomoku board: 20 five-cell windows, each missing one stone
+    geometry = get_geometry(15, 5)
+    mask = sum(
+        1 << geometry.coords_to_position(row, col)
+        for row in range(15) for col in range(15) if (row + 2 * col) % 5
+    )
+    centre = geometry.coords_to_position(7, 7)
+    return lambda: geometry.is_win_at(mask, centre)
+
+
+# Fixtures for the database benchmarks, created once per process
+
+_fixtures = {}
+
+
+def _players():
+    if 'players' not in _fixtures:
+        User = get_user_model()
+        password = make_password(None)
+        _fixtures['players'] = User.objects.bulk_create([
+            User(username=f'benchmark-{name}', password=password) for name in ('x', 'o')
+        ])
+    return _fixtures['players']
+
+
+def _long_game():
+    """A finished 19x19 game with 300 audited moves, loaded the way the detail view loads it"""
+    if 'long_game' not in _fixtures:
+        player1, player2 = _players()
+        size, count = 19, 300
+        game = Game(player1=player1, player2=player2, status='finished', result='draw',
+                    board_size=size, win_length=5)
+        game.initialize_board()
+        game.save()
+        Move.objects.bulk_create([
+            Move(game=game, player=player2 if i % 2 else player1, position=i, move_number=i + 1)
+            for i in range(count)
+        ])
+        _fixtures['long_game'] = with_game_details(Game.objects.filter(id=game.id)).get()
+    return _fixtures['long_game']
+
+
+@benchmark('game_state build', number=10_000, database=True)
+def game_state_build(number):
+    # The uncached builder behind broadcast.game_state / game_state_message
+    game = _long_game()
+    return lambda: _build(game)
+
+
+@benchmark('GameSerializer 300 moves', number=20, database=True)
+def serialize_long_game(number):
+    game = _long_game()
+    return lambda: GameSerializer(game).data
+
+
+# X takes the top row: five moves, the last one finishing the game
+WINNING_GAME = (0, 3, 1, 4, 2)
+
+
+@benchmark('process_move game', number=20, database=True)
+def process_move_game(number):
+    """One full 3x3 game per call through GameActor.process_move, from loading to the final flush"""
+    player1, player2 = _players()
+    games = []
+    for _ in range(number):
+        game = Game(player1=player1, player2=player2, current_turn=player1, status='in_progress')
+        game.initialize_board()
+        games.append(game)
+    games = iter(Game.objects.bulk_create(games))
+
+    async def play():
+        game = next(games)
+        actor = GameActor(game.id)
+        players = (player1, player2)
+        for i, position in enumerate(WINNING_GAME):
+            result = await actor.process_move(players[i % 2], position)
+            if not result['success']:
+                raise RuntimeError(result['error'])
+        await store.aflush()
+
+    return play
@@ -0,0 +1,55 @@
+"""Built-in bot opponent, playing from the precomputed solver table through GameActor.process_move."""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .solver import best_move
+from .matchmaking import seat_player2
+
+logger = logging.getLogger(__name__)
+
+
+def get_bot_user():
+    """Return the bot user, creating it on first use"""
+    User = get_user_model()
+    bot, created = User.objects.get_or_create(
+        username=settings.BOT_USERNAME,
+        defaults={'is_bot': True}
+    )
+    if created:
+        bot.set_unusable_password()
+        bot.save(update_fields=['password'])
+        logger.info(f"[Bot] Created bot user {bot.username}")
+    return bot
+
+
+def can_play(game):
+    """The solver only covers the classic 3x3 board"""
+    return game.board_size == 3 and game.win_length == 3
+
+
+def should_match_with_bot(game):
+    """True if a waiting game has waited long enough for the bot to join"""
+    timeout = settings.BOT_MATCHMAKING_TIMEOUT
+    return (
+        timeout > 0
+        and game.status == 'waiting'
+        and game.player2_id is None
+        and can_play(game)
+        and game.created_at <= timezone.now() - timedelta(seconds=timeout)
+    )
+
+
+def match_with_bot(game):
+    """Seat the bot as player 2 of a waiting game and start it; False if a player got there first"""
+    if not seat_player2(game, get_bot_user()):
+        game.refresh_from_db()
+        return False
+    logger.info(f"[Bot] Bot joined game {game.id} against {game.player1.username}")
+    return True
+
+
+def choose_move(x_mask, o_mask):
+    """Perfect-play position (0-8) for the side to move on a 3x3 board"""
+    return best_move(x_mask, o_mask)
@@ -0,0 +1,107 @@
+"""Game state payloads for WebSocket broadcasts, built and encoded once per game version."""
+import json
+import threading
+from collections import OrderedDict
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from .event_log import event_log
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+STATE_CACHE_SIZE = 1024
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def encode(message):
+    """JSON-encode a message for a text frame, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(',', ':'))
+
+
+def _player(player, symbol=None):
+    data = {'id': str(player.id), 'username': player.username}
+    if symbol:
+        data['symbol'] = symbol
+    return data
+
+
+def _build(game):
+    state = {
+        'id': str(game.id),
+        'player1': _player(game.player1, 'X'),
+        'player2': _player(game.player2, 'O') if game.player2 else None,
+        'board_state': game.board_state,
+        'board_size': game.board_size,
+        'win_length': game.win_length,
+        'current_turn': _player(game.current_turn) if game.current_turn else None,
+        'status': game.status,
+        'winner': _player(game.winner) if game.winner else None,
+        'result': game.result,
+        'seq': game.version
+    }
+    return state, encode({'type': 'game_state', 'game': state})
+
+
+def _cached(game):
+    key = (game.id, game.version)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            return entry
+    entry = _build(game)
+    with _lock:
+        _cache[key] = entry
+        if len(_cache) > STATE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return entry
+
+
+def game_state(game):
+    """State dict for a Game or LiveGame; treat as read-only, it is shared"""
+    return _cached(game)[0]
+
+
+def game_state_message(game):
+    """Pre-encoded {'type': 'game_state', 'game': ...} text frame"""
+    return _cached(game)[1]
+
+
+def move_applied_message(live):
+    """Encoded delta for the last move applied to a LiveGame"""
+    message = {
+        'type': 'move_applied',
+        'seq': live.version,
+        'position': live.moves[-1],
+        'symbol': 'X' if len(live.moves) % 2 else 'O',
+        'next_turn': str(live.current_turn.id) if live.status == 'in_progress' else None,
+        'status': live.status,
+    }
+    if live.status == 'finished':
+        message['result'] = live.result
+        message['winner'] = str(live.winner.id) if live.winner else None
+    return encode(message)
+
+
+def notify_game_update(game):
+    """Push a Game's full state to everyone in its WebSocket group (sync callers)"""
+    text = game_state_message(game)
+    event_log.record(game.id, game.version, text)
+    send_to_game_group(game.id, text)
+
+
+def send_to_game_group(game_id, text):
+    """Forward an encoded message to a game's WebSocket group (sync callers)"""
+    async_to_sync(get_channel_layer().group_send)(
+        f'game_{game_id}',
+        {
+            'type': 'game_update',
+            'text': text
+        }
+    )
@@ -1,43 +1,56 @@
+import asyncio
 import json
 import logging
+from datetime import timedelta
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import AccessToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from .models import Game, Move
-from .game_logic import TicTacToeLogic
+from django.utils import timezone
+from .models import Game
+from .bot import match_with_bot, should_match_with_bot
+from .actors import (
+    local_game_state_message, local_resume_messages, request_game_state, request_resume, start_listener,
+    submit_move
+)
+from .ownership import is_local
+from .broadcast import notify_game_update
+from .matchmaking import ACTIVE, MATCHED, get_matchmaker
+from .serializer import GameSettingsSerializer
+from . import lobby
 
 logger = logging.getLogger(__name__)
 
-class GameConsumer(AsyncWebsocketConsumer):
+
+class TokenAuthMixin:
+    async def authenticate(self):
+        """Close the socket if accounts.middleware rejected its token; False if closed"""
+        if self.scope.get('auth_error'):
+            await self.close()
+            return False
+        user = self.scope['user']
+        if user.is_authenticated:
+            logger.info(f"WebSocket authenticated user: {user.username}")
+        else:
+            logger.warning("No JWT token provided in WebSocket connection")
+        return True
+
+
+async def forward_encoded(consumer, event):
+    """Group event handler: the text was encoded once by the sender and is sent unchanged"""
+    await consumer.send(text_data=event['text'])
+
+
+class GameConsumer(TokenAuthMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.game_id = self.scope['url_route']['kwargs']['game_id']
         self.game_group_name = f'game_{self.game_id}'
 
-        # Authenticate user from JWT token in query string
-        query_string = self.scope['query_string'].decode()
-        token = query_string.split('token=')[1] if 'token=' in query_string else None
-
-        if token:
-            try:
-                access_token = AccessToken(token)
-                user_id = access_token['user_id']
-                User = get_user_model()
-                self.scope['user'] = await database_sync_to_async(User.objects.get)(id=user_id)
-                logger.info(f"WebSocket authenticated user: {self.scope['user'].username}")
-            except (InvalidToken, TokenError) as e:
-                logger.warning(f"Invalid JWT token in WebSocket connection: {e}")
-                await self.close()
-                return
-            except User.DoesNotExist as e:
-                logger.warning(f"User not found for JWT token: {e}")
-                await self.close()
-                return
-        else:
-            logger.warning("No JWT token provided in WebSocket connection")
-            self.scope['user'] = self.scope.get('user', None)
+        if not await self.authenticate():
+            return
+        # Servers without ASGI lifespan events start the forwarded-move listener here
+        start_listener()
 
         await self.channel_layer.group_add(
             self.game_group_name,
@@ -46,12 +59,14 @@ class GameConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        # Send current game state
-        game_state = await self.get_game_state()
-        await self.send(text_data=json.dumps({
-            'type': 'game_state',
-            'game': game_state
-        }))
+        # Reconnecting clients pass the last seq they saw and get only what they missed
+        query = parse_qs(self.scope['query_string'].decode('latin-1'))
+        last_seq = query.get('seq', [''])[0]
+        if last_seq.isdigit():
+            await self.resume(int(last_seq))
+        else:
+            # Send current game state
+            await self.send_game_state()
     
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
@@ -65,200 +80,157 @@ class GameConsumer(AsyncWebsocketConsumer):
         
         if action == 'make_move':
             await self.handle_move(data)
+        elif action == 'sync':
+            # Client detected a seq gap: resend the full state
+            await self.send_game_state()
+        elif action == 'resume':
+            seq = data.get('seq')
+            if type(seq) is int:
+                await self.resume(seq)
+
+    async def resume(self, last_seq):
+        """Replay events after last_seq, or a snapshot once the owner's event log has rotated past it"""
+        if not is_local(self.game_id):
+            # Only the owner holds the live game and its event log
+            await request_resume(self.game_id, last_seq, self.channel_name)
+            return
+        # Events broadcast since group_add may arrive twice; clients drop seq <= last seen
+        for text in await local_resume_messages(self.game_id, last_seq):
+            await self.send(text_data=text)
     
     async def handle_move(self, data):
         position = data.get('position')
         user = self.scope['user']
 
-        logger.info(f"Move attempt by user {user.username} (ID: {user.id}) at position {position}")
-
-        if not user or not user.is_authenticated:
-            logger.warning(f"Unauthenticated move attempt from user: {user}")
+        if not user.is_authenticated:
+            logger.warning(f"Unauthenticated move attempt on game {self.game_id}")
             await self.send(text_data=json.dumps({
                 'type': 'error',
                 'message': 'Not authenticated'
             }))
             return
 
-        # Validate and process move
-        result = await self.process_move(user, position)
-
-        if result['success']:
-            logger.info(f"Move successful for game {self.game_id}, broadcasting to group {self.game_group_name}")
-            # Broadcast to all players in game
-            await self.channel_layer.group_send(
-                self.game_group_name,
-                {
-                    'type': 'game_update',
-                    'game': result['game_state']
-                }
-            )
-        else:
-            logger.warning(f"Move failed for game {self.game_id}: {result['error']}")
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': result['error']
-            }))
-    
-    async def game_update(self, event):
+        logger.info(f"Move attempt by user {user.username} (ID: {user.id}) at position {position}")
+        # Applied in order by the game's actor, which broadcasts the result to the group
+        await submit_move(self.game_id, user, position, self.channel_name)
+
+    async def move_error(self, event):
         await self.send(text_data=json.dumps({
-            'type': 'game_state',
-            'game': event['game']
+            'type': 'error',
+            'message': event['message']
         }))
+
+    game_update = forward_encoded
     
+    async def send_game_state(self):
+        """Send a game_state snapshot: built here if this worker owns the game, else by the owner"""
+        if is_local(self.game_id):
+            await self.send(text_data=await local_game_state_message(self.game_id))
+        else:
+            await request_game_state(self.game_id, self.channel_name)
+
+
+class LobbyConsumer(TokenAuthMixin, AsyncWebsocketConsumer):
+    """
+    Push-based matchmaking: enqueue once and receive a matched event, or
+    browse the open games as a snapshot followed by diffs.
+    """
+
+    async def connect(self):
+        self.browsing = False
+        self.bot_timer = None
+        self.user_group_name = None
+        if not await self.authenticate():
+            return
+
+        user = self.scope['user']
+        self.user_group_name = lobby.user_group(user.id) if user.is_authenticated else None
+        if self.user_group_name:
+            await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.bot_timer:
+            self.bot_timer.cancel()
+        if self.user_group_name:
+            await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        if self.browsing:
+            await self.channel_layer.group_discard(lobby.LOBBY_GROUP, self.channel_name)
+
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        action = data.get('action')
+
+        if action == 'enqueue':
+            await self.handle_enqueue(data)
+        elif action == 'browse':
+            await self.handle_browse()
+
+    async def handle_enqueue(self, data):
+        user = self.scope['user']
+        if not user or not user.is_authenticated:
+            await self.send_error('Not authenticated')
+            return
+
+        serializer = GameSettingsSerializer(data=data)
+        if not serializer.is_valid():
+            await self.send_error(serializer.errors)
+            return
+
+        game, outcome = await self.join(user, serializer.validated_data)
+        if game.status == 'waiting':
+            logger.info(f"[Lobby] {user.username} queued in game {game.id}")
+            await self.send(text_data=json.dumps({'type': 'queued', 'game_id': str(game.id)}))
+            self.start_bot_timer(game)
+        elif outcome == ACTIVE:
+            # Already playing: nothing new is pushed, so answer directly
+            await self.send(text_data=json.dumps({'type': 'matched', 'game_id': str(game.id)}))
+        # MATCHED: seat_player2 pushes the matched event to both players' user groups
+
     @database_sync_to_async
-    def get_game_state(self):
-        try:
-            game = Game.objects.select_related(
-                'player1', 'player2', 'current_turn', 'winner'
-            ).get(id=self.game_id)
-            
-            return {
-                'id': str(game.id),
-                'player1': {
-                    'id': str(game.player1.id),
-                    'username': game.player1.username,
-                    'symbol': 'X'
-                },
-                'player2': {
-                    'id': str(game.player2.id),
-                    'username': game.player2.username,
-                    'symbol': 'O'
-                } if game.player2 else None,
-                'board_state': game.board_state,
-                'current_turn': {
-                    'id': str(game.current_turn.id),
-                    'username': game.current_turn.username
-                } if game.current_turn else None,
-                'status': game.status,
-                'winner': {
-                    'id': str(game.winner.id),
-                    'username': game.winner.username
-                } if game.winner else None,
-                'result': game.result
-            }
-        except Game.DoesNotExist:
-            return None
-    
-    @database_sync_to_async
-    def process_move(self, user, position):
+    def join(self, principal, board_settings):
+        # Matchmaking needs the rating and a model instance, not just the socket principal
+        user = get_user_model().objects.get(id=principal.id)
+        game, outcome = get_matchmaker().join(user, **board_settings)
+        if outcome == ACTIVE and should_match_with_bot(game) and match_with_bot(game):
+            outcome = MATCHED
+        if outcome == MATCHED:
+            notify_game_update(game)
+        return game, outcome
+
+    def start_bot_timer(self, game):
+        """Match the bot in after BOT_MATCHMAKING_TIMEOUT, since a lobby client never re-polls"""
+        if self.bot_timer or settings.BOT_MATCHMAKING_TIMEOUT <= 0:
+            return
+        due = game.created_at + timedelta(seconds=settings.BOT_MATCHMAKING_TIMEOUT)
+        delay = max(0, (due - timezone.now()).total_seconds())
+        self.bot_timer = asyncio.create_task(self.bot_fallback(game.id, delay))
+
+    async def bot_fallback(self, game_id, delay):
+        await asyncio.sleep(delay)
+        self.bot_timer = None
         try:
-            game = Game.objects.select_related('player1', 'player2', 'current_turn').get(
-                id=self.game_id
-            )
-
-            logger.info(f"Processing move for game {game.id}, status: {game.status}")
-            logger.debug(f"Current turn: {game.current_turn.username if game.current_turn else None} (ID: {game.current_turn.id if game.current_turn else None})")
-            logger.debug(f"User attempting move: {user.username} (ID: {user.id})")
-
-            # Validate game state
-            if game.status != 'in_progress':
-                logger.warning(f"Move attempted on game {game.id} with status: {game.status}")
-                return {'success': False, 'error': 'Game is not in progress'}
-
-            # FIX: Compare UUIDs directly, not as strings
-            if game.current_turn is None or game.current_turn.id != user.id:
-                logger.warning(f"Turn validation failed for game {game.id}: current_turn.id ({game.current_turn.id if game.current_turn else None}) != user.id ({user.id})")
-                return {'success': False, 'error': 'Not your turn'}
-
-            # Validate move
-            row, col = TicTacToeLogic.position_to_coords(position)
-            if not TicTacToeLogic.is_valid_move(game.board_state, row, col):
-                return {'success': False, 'error': 'Invalid move'}
-
-            # Determine player symbol
-            symbol = 'X' if user == game.player1 else 'O'
-            logger.info(f"Player {user.username} making move with symbol {symbol} at position {position} (row {row}, col {col})")
-
-            # Make move
-            game.board_state[row][col] = symbol
-            logger.debug(f"Board after move: {game.board_state}")
-
-            # Record move
-            move_count = game.moves.count()
-            Move.objects.create(
-                game=game,
-                player=user,
-                position=position,
-                move_number=move_count + 1
-            )
-
-            # Check for winner
-            winner_symbol = TicTacToeLogic.check_winner(game.board_state)
-            if winner_symbol:
-                game.status = 'finished'
-                game.winner = game.player1 if winner_symbol == 'X' else game.player2
-                game.result = 'player1_win' if winner_symbol == 'X' else 'player2_win'
-                game.finished_at = timezone.now()
-
-                # Update stats
-                game.winner.wins += 1
-                game.winner.rating += 25
-                game.winner.save()
-
-                loser = game.player2 if winner_symbol == 'X' else game.player1
-                loser.losses += 1
-                loser.rating = max(0, loser.rating - 15)
-                loser.save()
-
-            elif TicTacToeLogic.is_board_full(game.board_state):
-                game.status = 'finished'
-                game.result = 'draw'
-                game.finished_at = timezone.now()
-
-                # Update stats
-                game.player1.draws += 1
-                game.player2.draws += 1
-                game.player1.rating += 5
-                game.player2.rating += 5
-                game.player1.save()
-                game.player2.save()
-            else:
-                # Switch turn
-                old_turn = game.current_turn
-                game.current_turn = game.player2 if user == game.player1 else game.player1
-                logger.info(f"Turn switched from {old_turn.username} to {game.current_turn.username}")
-
-            game.save()
-
-            # FIX: Call the sync helper method instead of async one
-            game_state = self._build_game_state(game)
-            logger.debug(f"Returning game state for game {game.id}")
-            return {
-                'success': True,
-                'game_state': game_state
-            }
-
-        except Game.DoesNotExist:
-            logger.error(f"Game not found: {self.game_id}")
-            return {'success': False, 'error': 'Game not found'}
+            await database_sync_to_async(self.match_bot)(game_id)
         except Exception as e:
-            logger.error(f"Exception in process_move for game {self.game_id}: {e}", exc_info=True)
-            return {'success': False, 'error': 'Internal server error'}
-
-    def _build_game_state(self, game):
-        """Helper method to build game state dict (not async)"""
-        return {
-            'id': str(game.id),
-            'player1': {
-                'id': str(game.player1.id),
-                'username': game.player1.username,
-                'symbol': 'X'
-            },
-            'player2': {
-                'id': str(game.player2.id),
-                'username': game.player2.username,
-                'symbol': 'O'
-            } if game.player2 else None,
-            'board_state': game.board_state,
-            'current_turn': {
-                'id': str(game.current_turn.id),
-                'username': game.current_turn.username
-            } if game.current_turn else None,
-            'status': game.status,
-            'winner': {
-                'id': str(game.winner.id),
-                'username': game.winner.username
-            } if game.winner else None,
-            'result': game.result
-        }
\ No newline at end of file
+            logger.error(f"[Lobby] Bot fallback failed for game {game_id}: {e}", exc_info=True)
+
+    def match_bot(self, game_id):
+        game = Game.objects.select_related('player1').filter(id=game_id).first()
+        if game and should_match_with_bot(game) and match_with_bot(game):
+            notify_game_update(game)
+
+    async def handle_browse(self):
+        if not self.browsing:
+            # Join first so no diff is lost; clients apply diffs idempotently by game id
+            await self.channel_layer.group_add(lobby.LOBBY_GROUP, self.channel_name)
+            self.browsing = True
+        await self.send(text_data=await database_sync_to_async(lobby.open_games_message)())
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'message': message
+        }))
+
+    lobby_update = forward_encoded
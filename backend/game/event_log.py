@@ -0,0 +1,46 @@
+"""Bounded per-game log of recent broadcast events, used to resume sockets."""
+import threading
+from collections import OrderedDict, deque
+from django.conf import settings
+
+# Games with a log kept in memory; least recently used logs are dropped first
+MAX_LOGGED_GAMES = 10000
+
+
+class EventLog:
+    def __init__(self):
+        self._logs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, game_id, seq, text):
+        """Append an encoded event; events must be recorded in seq order"""
+        with self._lock:
+            log = self._logs.get(game_id)
+            if log is None:
+                log = self._logs[game_id] = deque(maxlen=settings.GAME_EVENT_LOG_SIZE)
+                if len(self._logs) > MAX_LOGGED_GAMES:
+                    self._logs.popitem(last=False)
+            else:
+                self._logs.move_to_end(game_id)
+            log.append((seq, text))
+
+    def since(self, game_id, last_seq, current_seq):
+        """Encoded events with last_seq < seq <= current_seq, or None when a snapshot is needed"""
+        if last_seq == current_seq:
+            return []
+        if last_seq > current_seq:
+            return None
+        with self._lock:
+            log = self._logs.get(game_id)
+            events = [(seq, text) for seq, text in log if seq > last_seq] if log else []
+        expected = range(last_seq + 1, current_seq + 1)
+        if [seq for seq, _ in events] != list(expected):
+            return None
+        return [text for _, text in events]
+
+    def discard(self, game_id):
+        with self._lock:
+            self._logs.pop(game_id, None)
+
+
+event_log = EventLog()
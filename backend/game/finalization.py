@@ -0,0 +1,62 @@
+"""Game finalization: mark a game finished and settle both players' stats in one transaction."""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from accounts.leaderboard import get_leaderboard
+from django.utils import timezone
+from .models import Game
+from .ratings import RATING_FIELDS, RESULT_SCORES, rate_game
+from .versions import record_game_changes
+
+
+def finalize_game(game_id, player1_id, player2_id, result, **fields):
+    """Finish a game with `result` (and further Game `fields`) and settle stats; False if already finished"""
+    now = timezone.now()
+    fields.update(
+        status='finished',
+        result=result,
+        winner_id={'player1_win': player1_id, 'player2_win': player2_id}.get(result),
+    )
+    fields.setdefault('finished_at', now)
+    fields.setdefault('updated_at', now)
+    fields.setdefault('version', F('version') + 1)
+
+    with transaction.atomic():
+        if not Game.objects.filter(id=game_id).exclude(status='finished').update(**fields):
+            return False
+        version = fields['version']
+        if not isinstance(version, int):
+            version = Game.objects.values_list('version', flat=True).get(id=game_id)
+        change = (game_id, version, (player1_id, player2_id))
+        transaction.on_commit(lambda: record_game_changes([change]))
+        settle_player_stats(player1_id, player2_id, result)
+    return True
+
+
+COUNTERS = {1.0: 'wins', 0.5: 'draws', 0.0: 'losses'}
+
+
+def settle_player_stats(player1_id, player2_id, result):
+    """Apply a result's counters and rating changes; abandoned games change nothing"""
+    score = RESULT_SCORES.get(result)
+    if score is None:
+        return
+    users = get_user_model().objects
+    # Lock in id order so two games of the same players cannot deadlock
+    locked = {
+        user.id: user
+        for user in users.select_for_update().filter(id__in=[player1_id, player2_id])
+        .order_by('id').only('id', 'is_bot', *RATING_FIELDS)
+    }
+    ratings1, ratings2 = rate_game(locked[player1_id], locked[player2_id], result)
+
+    for player_id, player_score, ratings in ((player1_id, score, ratings1), (player2_id, 1 - score, ratings2)):
+        counter = COUNTERS[player_score]
+        users.filter(id=player_id).update(**{counter: F(counter) + 1}, **ratings)
+
+    ranked = {
+        player_id: ratings['rating']
+        for player_id, ratings in ((player1_id, ratings1), (player2_id, ratings2))
+        if not locked[player_id].is_bot
+    }
+    transaction.on_commit(lambda: get_leaderboard().record(ranked))
@@ -1,3 +1,6 @@
+from functools import lru_cache
+
+
 class TicTacToeLogic:
     @staticmethod
     def check_winner(board):
@@ -32,16 +35,202 @@ class TicTacToeLogic:
     @staticmethod
     def is_valid_move(board, row, col):
         """Check if move is valid"""
-        if row < 0 or row > 2 or col < 0 or col > 2:
+        size = len(board)
+        if row < 0 or row >= size or col < 0 or col >= size:
             return False
         return board[row][col] is None
     
     @staticmethod
-    def position_to_coords(position):
-        """Convert position (0-8) to row, col"""
-        return position // 3, position % 3
+    def position_to_coords(position, size=3):
+        """Convert position (0 to size*size-1) to row, col"""
+        return position // size, position % size
     
     @staticmethod
-    def coords_to_position(row, col):
-        """Convert row, col to position (0-8)"""
-        return row * 3 + col
\ No newline at end of file
+    def coords_to_position(row, col, size=3):
+        """Convert row, col to position (0 to size*size-1)"""
+        return row * size + col
+
+
+# Bitboard engine: each player's stones are a 9-bit mask where bit N is
+# board position N (row * 3 + col). Win/draw checks become table lookups.
+FULL_MASK = 0b111111111
+
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,  # rows
+    0b001001001, 0b010010010, 0b100100100,  # columns
+    0b100010001, 0b001010100,               # diagonals
+)
+
+# WINNING_MASKS[mask] is True when the stones in mask complete any line
+WINNING_MASKS = tuple(
+    any(mask & line == line for line in WIN_MASKS)
+    for mask in range(FULL_MASK + 1)
+)
+
+
+class BitBoard:
+    @staticmethod
+    def from_board(board):
+        """Convert a JSON list-of-lists board into (x_mask, o_mask)"""
+        x_mask = o_mask = 0
+        bit = 1
+        for row in board:
+            for cell in row:
+                if cell == 'X':
+                    x_mask |= bit
+                elif cell == 'O':
+                    o_mask |= bit
+                bit <<= 1
+        return x_mask, o_mask
+
+    @staticmethod
+    def to_board(x_mask, o_mask):
+        """Convert (x_mask, o_mask) back into the JSON list-of-lists layout"""
+        return [
+            [
+                'X' if x_mask >> position & 1 else 'O' if o_mask >> position & 1 else None
+                for position in range(row * 3, row * 3 + 3)
+            ]
+            for row in range(3)
+        ]
+
+    @staticmethod
+    def check_winner(x_mask, o_mask):
+        """Check if there's a winner. Returns 'X', 'O', or None"""
+        if WINNING_MASKS[x_mask]:
+            return 'X'
+        if WINNING_MASKS[o_mask]:
+            return 'O'
+        return None
+
+    @staticmethod
+    def is_board_full(x_mask, o_mask):
+        """Check if board is full (draw)"""
+        return x_mask | o_mask == FULL_MASK
+
+    @staticmethod
+    def is_valid_move(x_mask, o_mask, position):
+        """Check if position (0-8) is on the board and empty"""
+        if type(position) is not int or position < 0 or position > 8:
+            return False
+        return not (x_mask | o_mask) >> position & 1
+
+
+
+# Board sizes accepted for a game; win_length must lie in [MIN_BOARD_SIZE, board_size]
+MIN_BOARD_SIZE = 3
+MAX_BOARD_SIZE = 19
+
+# Directions a line can run in: right, down, down-right, down-left
+LINE_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class BoardGeometry:
+    """
+    Bitboard engine for an N x N board won by k in a row.
+
+    Bit N of a mask is position N (row * size + col). For every cell the
+    masks of all k-long windows passing through it are precomputed, so a
+    win check after a move only tests the lines through the placed stone:
+    O(k) integer ops instead of a full O(N^2) rescan.
+    """
+
+    def __init__(self, size, win_length):
+        if not MIN_BOARD_SIZE <= size <= MAX_BOARD_SIZE:
+            raise ValueError(f"board size must be between {MIN_BOARD_SIZE} and {MAX_BOARD_SIZE}")
+        if not MIN_BOARD_SIZE <= win_length <= size:
+            raise ValueError(f"win length must be between {MIN_BOARD_SIZE} and the board size")
+
+        self.size = size
+        self.win_length = win_length
+        self.cells = size * size
+        self.full_mask = (1 << self.cells) - 1
+
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in LINE_DIRECTIONS:
+                    end_row = row + d_row * (win_length - 1)
+                    end_col = col + d_col * (win_length - 1)
+                    if not (0 <= end_row < size and 0 <= end_col < size):
+                        continue
+                    line = 0
+                    for step in range(win_length):
+                        line |= 1 << ((row + d_row * step) * size + col + d_col * step)
+                    lines.append(line)
+        self.lines = tuple(lines)
+        self.lines_through = tuple(
+            tuple(line for line in self.lines if line >> position & 1)
+            for position in range(self.cells)
+        )
+
+    def position_to_coords(self, position):
+        """Convert position to row, col"""
+        return TicTacToeLogic.position_to_coords(position, self.size)
+
+    def coords_to_position(self, row, col):
+        """Convert row, col to position"""
+        return TicTacToeLogic.coords_to_position(row, col, self.size)
+
+    def empty_board(self):
+        """JSON list-of-lists board with every cell empty"""
+        return [[None] * self.size for _ in range(self.size)]
+
+    def from_board(self, board):
+        """Convert a JSON list-of-lists board into (x_mask, o_mask)"""
+        return BitBoard.from_board(board)
+
+    def to_board(self, x_mask, o_mask):
+        """Convert (x_mask, o_mask) back into the JSON list-of-lists layout"""
+        size = self.size
+        return [
+            [
+                'X' if x_mask >> position & 1 else 'O' if o_mask >> position & 1 else None
+                for position in range(row * size, row * size + size)
+            ]
+            for row in range(size)
+        ]
+
+    def is_valid_move(self, x_mask, o_mask, position):
+        """Check if position is on the board and empty"""
+        if type(position) is not int or position < 0 or position >= self.cells:
+            return False
+        return not (x_mask | o_mask) >> position & 1
+
+    def is_win_at(self, mask, position):
+        """Check if the stone at position completes a line in mask"""
+        for line in self.lines_through[position]:
+            if mask & line == line:
+                return True
+        return False
+
+    def check_winner(self, x_mask, o_mask):
+        """Full-board scan. Returns 'X', 'O', or None"""
+        for line in self.lines:
+            if x_mask & line == line:
+                return 'X'
+            if o_mask & line == line:
+                return 'O'
+        return None
+
+    def is_board_full(self, x_mask, o_mask):
+        """Check if board is full (draw)"""
+        return x_mask | o_mask == self.full_mask
+
+
+@lru_cache(maxsize=None)
+def get_geometry(size, win_length):
+    """Shared, cached BoardGeometry for a board size / win length pair"""
+    return BoardGeometry(size, win_length)
+
+
+# Move log: every position as fixed-width decimal digits ("004000009..."), plain ASCII on any board
+MOVE_LOG_WIDTH = len(str(MAX_BOARD_SIZE ** 2 - 1))
+
+
+def encode_moves(positions):
+    return ''.join(f'{position:0{MOVE_LOG_WIDTH}d}' for position in positions)
+
+
+def decode_moves(move_log):
+    return [int(move_log[i:i + MOVE_LOG_WIDTH]) for i in range(0, len(move_log), MOVE_LOG_WIDTH)]
@@ -0,0 +1,97 @@
+"""Drive real games over game sockets and time each move's round trip, for the load test commands."""
+import json
+import random
+import time
+import uuid
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.tokens import PRINCIPAL_CLAIMS
+from .models import Game
+
+USERNAME_PREFIX = 'loadtest-'
+
+
+def create_players(count):
+    """`count` new users named loadtest-<run>-<n>"""
+    run = uuid.uuid4().hex[:8]
+    password = make_password(None)
+    User = get_user_model()
+    return User.objects.bulk_create([
+        User(username=f'{USERNAME_PREFIX}{run}-{i}', password=password) for i in range(count)
+    ])
+
+
+def delete_players(players):
+    """Delete load test users along with their games"""
+    get_user_model().objects.filter(id__in=[player.id for player in players]).delete()
+
+
+def access_token(user):
+    token = AccessToken.for_user(user)
+    for claim in PRINCIPAL_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return str(token)
+
+
+def start_games(pairs, board_size=3, win_length=3):
+    """In-progress games for (player1, player2) pairs, created directly"""
+    games = []
+    for player1, player2 in pairs:
+        game = Game(player1=player1, player2=player2, current_turn=player1, status='in_progress',
+                    board_size=board_size, win_length=win_length)
+        game.initialize_board()
+        games.append(game)
+    return Game.objects.bulk_create(games)
+
+
+class WebSocketConnection:
+    """Connection over a `websockets` client socket"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    async def send_json(self, message):
+        await self.websocket.send(json.dumps(message))
+
+    async def receive_json(self):
+        return json.loads(await self.websocket.recv())
+
+
+async def receive_type(connection, message_type):
+    """Next message of a type, skipping others; raises on an error message"""
+    while True:
+        message = await connection.receive_json()
+        if message['type'] == message_type:
+            return message
+        if message['type'] == 'error':
+            raise RuntimeError(message['message'])
+
+
+async def play_game(player1, player2, cells, round_trips, rng=random):
+    """Play one game to the end over two fresh connections; returns the moves played"""
+    for connection in (player1, player2):
+        await receive_type(connection, 'game_state')
+    free = list(range(cells))
+    mover, waiter = player1, player2
+    moves = 0
+    while True:
+        position = free.pop(rng.randrange(len(free)))
+        started = time.perf_counter()
+        await mover.send_json({'action': 'make_move', 'position': position})
+        message = await receive_type(mover, 'move_applied')
+        round_trips.append(time.perf_counter() - started)
+        await receive_type(waiter, 'move_applied')
+        moves += 1
+        if message['status'] == 'finished':
+            return moves
+        mover, waiter = waiter, mover
+
+
+def latency_percentiles(round_trips):
+    """p50 / p95 / p99 of round trips, in milliseconds"""
+    if not round_trips:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(np.array(round_trips) * 1000, [50, 95, 99])
+    return {'p50': round(p50, 2), 'p95': round(p95, 2), 'p99': round(p99, 2)}
@@ -0,0 +1,71 @@
+"""Lobby events (matched, open games and their diffs) pushed to /ws/lobby/ sockets on commit."""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from .models import Game
+from .broadcast import encode
+
+LOBBY_GROUP = 'lobby'
+
+# Open games sent to a client when it starts browsing, oldest first
+OPEN_GAMES_LIMIT = 100
+
+
+def user_group(user_id):
+    return f'user_{user_id}'
+
+
+def open_game(game):
+    """Lobby entry for a waiting game"""
+    return {
+        'id': str(game.id),
+        'player1': {
+            'id': str(game.player1.id),
+            'username': game.player1.username,
+            'rating': game.player1.rating,
+        },
+        'board_size': game.board_size,
+        'win_length': game.win_length,
+        'created_at': game.created_at.isoformat(),
+    }
+
+
+def open_games_message():
+    """Encoded snapshot of the open games (sync callers)"""
+    games = (
+        Game.objects.filter(status='waiting', player2__isnull=True)
+        .select_related('player1')
+        .order_by('created_at')[:OPEN_GAMES_LIMIT]
+    )
+    return encode({'type': 'open_games', 'games': [open_game(game) for game in games]})
+
+
+def _send(group, text):
+    async_to_sync(get_channel_layer().group_send)(
+        group,
+        {
+            'type': 'lobby_update',
+            'text': text
+        }
+    )
+
+
+def game_opened(game):
+    """Add a new waiting game to browsing clients' lists (sync callers)"""
+    _send(LOBBY_GROUP, encode({'type': 'open_games_diff', 'added': [open_game(game)], 'removed': []}))
+
+
+def games_closed(*game_ids):
+    """Remove games that are no longer open from browsing clients' lists (sync callers)"""
+    _send(LOBBY_GROUP, encode({
+        'type': 'open_games_diff',
+        'added': [],
+        'removed': [str(game_id) for game_id in game_ids]
+    }))
+
+
+def game_matched(game):
+    """Tell both players' lobby sockets where their game is, and close it in the lobby"""
+    text = encode({'type': 'matched', 'game_id': str(game.id)})
+    _send(user_group(game.player1_id), text)
+    _send(user_group(game.player2_id), text)
+    games_closed(game.id)
@@ -0,0 +1,75 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from game.benchmarks import BASELINE_PATH, BENCHMARKS, DEFAULT_MAX_REGRESSION, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the game microbenchmarks (game.benchmarks): win/draw checks on lists, bitboards and "
+        "board geometries, game_state building, "
+        "GameSerializer on a long game and process_move end to end, the last three against a "
+        "throwaway test database. --save writes the results as a baseline; --compare fails when "
+        "a benchmark's median is more than --max-regression percent slower than the baseline's."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run (default: all)')
+        parser.add_argument('--rounds', type=int, default=7, help='Timed rounds per benchmark')
+        parser.add_argument('--save', metavar='PATH', nargs='?', const=BASELINE_PATH,
+                            help=f'Write the results to a baseline JSON file (default {BASELINE_PATH.name})')
+        parser.add_argument('--compare', metavar='PATH', nargs='?', const=BASELINE_PATH,
+                            help=f'Baseline JSON file to compare against (default {BASELINE_PATH.name})')
+        parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                            help='Allowed slowdown of a median, in percent')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        benchmarks = [BENCHMARKS[name] for name in options['names'] or BENCHMARKS]
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        if any(bench.database for bench in benchmarks):
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                results = run_benchmarks(benchmarks, options['rounds'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        else:
+            results = run_benchmarks(benchmarks, options['rounds'])
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(results, f, indent=2)
+                f.write('\n')
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        elif baseline is None:
+            for name, result in results['benchmarks'].items():
+                self.stdout.write(
+                    f"{name:<32} median {result['median_us']:>12.3f} us  "
+                    f"min {result['min_us']:>12.3f} us  ({result['rounds']} x {result['number']})"
+                )
+
+        if baseline is not None:
+            rows = compare(baseline, results, options['max_regression'])
+            if not options['json']:
+                for name, before, after, change, regressed in rows:
+                    self.stdout.write(
+                        f"{name:<32} {before:>12.3f} -> {after:>12.3f} us  {change:+6.1f}%"
+                        + ('  REGRESSED' if regressed else '')
+                    )
+            regressed = [row[0] for row in rows if row[4]]
+            if regressed:
+                raise CommandError(
+                    f"Slower than the baseline by more than {options['max_regression']}%: {', '.join(regressed)}"
+                )
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from game.loadtest import (
+    WebSocketConnection, access_token, create_players, delete_players, latency_percentiles, play_game,
+    start_games
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure game throughput against runworkers at each worker count: plays --games full games "
+        "over real sockets, --concurrency at a time, and reports moves/sec and move round trips. "
+        "Needs the configured database and a Redis channel layer, like production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to compare')
+        parser.add_argument('--games', type=int, default=200, help='Games per run')
+        parser.add_argument('--concurrency', type=int, default=50, help='Games in flight at once')
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument('--board-size', type=int, default=3)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            import websockets
+        except ImportError:
+            raise CommandError('benchmark_workers needs the websockets package (pip install "uvicorn[standard]")')
+        if max(options['workers']) > 1 and 'InMemory' in settings.CHANNEL_LAYERS['default']['BACKEND']:
+            raise CommandError('Several workers need a shared channel layer; configure Redis')
+
+        results = []
+        for workers in options['workers']:
+            server = subprocess.Popen(
+                [sys.executable, 'manage.py', 'runworkers', '--workers', str(workers),
+                 '--host', '127.0.0.1', '--port', str(options['port']), '--log-level', 'warning'],
+                cwd=settings.BASE_DIR, env=dict(os.environ)
+            )
+            try:
+                self.wait_for_port(options['port'], server)
+                results.append(self.run(websockets, workers, options))
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+            if not options['json']:
+                self.print_result(results[-1])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        elif len(results) > 1:
+            base = results[0]['moves_per_sec']
+            self.stdout.write('Scaling: ' + ', '.join(
+                f"{result['workers']} workers x{result['moves_per_sec'] / base:.2f}" for result in results
+            ))
+
+    def wait_for_port(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'runworkers exited with code {server.returncode}')
+            with socket.socket() as probe:
+                if probe.connect_ex(('127.0.0.1', port)) == 0:
+                    return
+            time.sleep(0.2)
+        raise CommandError(f'runworkers did not listen on port {port} within {timeout}s')
+
+    def run(self, websockets, workers, options):
+        size = options['board_size']
+        players = create_players(2 * options['games'])
+        try:
+            pairs = list(zip(players[::2], players[1::2]))
+            games = start_games(pairs, board_size=size, win_length=min(size, 5))
+            tokens = {player.id: access_token(player) for player in players}
+            sessions = [
+                (game.id, tokens[player1.id], tokens[player2.id])
+                for game, (player1, player2) in zip(games, pairs)
+            ]
+            round_trips = []
+            started = time.perf_counter()
+            moves = asyncio.run(self.play_all(websockets, sessions, size * size, round_trips, options))
+            elapsed = time.perf_counter() - started
+        finally:
+            delete_players(players)
+        return {
+            'workers': workers,
+            'games': len(sessions),
+            'moves': moves,
+            'seconds': round(elapsed, 2),
+            'moves_per_sec': round(moves / elapsed, 1),
+            'round_trip_ms': latency_percentiles(round_trips),
+        }
+
+    async def play_all(self, websockets, sessions, cells, round_trips, options):
+        limit = asyncio.Semaphore(options['concurrency'])
+        url = f"ws://127.0.0.1:{options['port']}/ws/game/{{}}/?token={{}}"
+
+        async def play(game_id, token1, token2):
+            async with limit:
+                async with websockets.connect(url.format(game_id, token1)) as socket1, \
+                        websockets.connect(url.format(game_id, token2)) as socket2:
+                    return await play_game(
+                        WebSocketConnection(socket1), WebSocketConnection(socket2), cells, round_trips
+                    )
+
+        return sum(await asyncio.gather(*(play(*session) for session in sessions)))
+
+    def print_result(self, result):
+        latency = result['round_trip_ms']
+        self.stdout.write(
+            f"{result['workers']} workers: {result['games']} games, {result['moves']} moves in "
+            f"{result['seconds']}s = {result['moves_per_sec']} moves/s; round trip ms "
+            f"p50 {latency['p50']} p95 {latency['p95']} p99 {latency['p99']}"
+        )
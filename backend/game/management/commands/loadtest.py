@@ -0,0 +1,155 @@
+import asyncio
+import json
+import threading
+import time
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from accounts.middleware import JWTAuthMiddleware
+from game.loadtest import access_token, create_players, delete_players, latency_percentiles, play_game
+from game.matchmaking import MATCHED, DatabaseMatchmaker
+from game.routing import websocket_urlpatterns
+from game.state_store import store
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries of every connection it is installed on"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install_all(self):
+        """Wrap this thread's open connections, and every connection opened from now on"""
+        for connection in connections.all():
+            self.install(connection)
+        connection_created.connect(self.install)
+
+    def uninstall_all(self):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class CommunicatorConnection:
+    """game.loadtest connection over an in-process WebsocketCommunicator"""
+
+    def __init__(self, communicator, timeout):
+        self.communicator = communicator
+        self.timeout = timeout
+
+    async def send_json(self, message):
+        await self.communicator.send_json_to(message)
+
+    async def receive_json(self):
+        return await self.communicator.receive_json_from(timeout=self.timeout)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test one node in process: register --players users, pair them through matchmaking and "
+        "play every game to the end over ws/game/<id>/ (in-memory channel layer, configured database), "
+        "--concurrency games at a time. Reports move round trips, moves/sec and queries per move."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=1000, help='Players (two per game)')
+        parser.add_argument('--concurrency', type=int, default=100, help='Games in flight at once')
+        parser.add_argument('--board-size', type=int, default=3)
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for any one message')
+        parser.add_argument('--keep', action='store_true', help='Keep the load test users and games')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        size = options['board_size']
+        with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}):
+            started = time.perf_counter()
+            players = create_players(options['players'] // 2 * 2)
+            try:
+                games = self.pair(players, size)
+                paired = time.perf_counter()
+
+                counter = QueryCounter()
+                round_trips = []
+                moves = asyncio.run(self.play_all(games, size * size, round_trips, counter, options))
+                played = time.perf_counter()
+            finally:
+                if not options['keep']:
+                    delete_players(players)
+
+        result = {
+            'players': len(players),
+            'games': len(games),
+            'concurrency': options['concurrency'],
+            'moves': moves,
+            'setup_seconds': round(paired - started, 2),
+            'play_seconds': round(played - paired, 2),
+            'moves_per_sec': round(moves / (played - paired), 1),
+            'round_trip_ms': latency_percentiles(round_trips),
+            'queries_per_move': round(counter.count / moves, 3) if moves else None,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        latency = result['round_trip_ms']
+        self.stdout.write(
+            f"{result['games']} games ({result['players']} players, set up in {result['setup_seconds']}s), "
+            f"{result['concurrency']} at a time: {moves} moves in {result['play_seconds']}s = "
+            f"{result['moves_per_sec']} moves/s\n"
+            f"Move round trip ms: p50 {latency['p50']} p95 {latency['p95']} p99 {latency['p99']}\n"
+            f"Database queries per move: {result['queries_per_move']}"
+        )
+
+    def pair(self, players, size):
+        """Queue every player through matchmaking; consecutive players meet in one game"""
+        matchmaker = DatabaseMatchmaker()
+        games = []
+        for player in players:
+            game, outcome = matchmaker.join(player, board_size=size, win_length=min(size, 5))
+            if outcome == MATCHED:
+                games.append((game.id, access_token(game.player1), access_token(player)))
+        return games
+
+    async def play_all(self, games, cells, round_trips, counter, options):
+        application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+        limit = asyncio.Semaphore(options['concurrency'])
+
+        async def play(game_id, token1, token2):
+            async with limit:
+                communicators = [
+                    WebsocketCommunicator(application, f'/ws/game/{game_id}/?token={token}')
+                    for token in (token1, token2)
+                ]
+                for communicator in communicators:
+                    await communicator.connect(timeout=options['timeout'])
+                try:
+                    return await play_game(
+                        *(CommunicatorConnection(c, options['timeout']) for c in communicators),
+                        cells, round_trips
+                    )
+                finally:
+                    for communicator in communicators:
+                        await communicator.disconnect()
+
+        # Consumers query from the thread shared by database_sync_to_async, which may hold connections already
+        await database_sync_to_async(counter.install_all)()
+        try:
+            moves = sum(await asyncio.gather(*(play(*game) for game in games)))
+            await store.aflush()
+        finally:
+            await database_sync_to_async(counter.uninstall_all)()
+        return moves
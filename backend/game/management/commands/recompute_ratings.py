@@ -0,0 +1,103 @@
+import time
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.leaderboard import get_leaderboard
+from game.models import Game
+from game.ratings import ENGINES, RESULT_SCORES, Ratings, get_rating_engine, initial_ratings
+
+
+def rating_waves(player1, player2):
+    """
+    Group games into waves that can be rated together, as arrays of game indices.
+
+    A game's wave is one past the later of its players' previous games, so
+    every player's games stay in order and no player appears twice in a wave.
+    """
+    last_wave = {}
+    waves = np.empty(len(player1), dtype=np.int64)
+    for i, (a, b) in enumerate(zip(player1.tolist(), player2.tolist())):
+        wave = max(last_wave.get(a, -1), last_wave.get(b, -1)) + 1
+        waves[i] = last_wave[a] = last_wave[b] = wave
+    order = np.argsort(waves, kind='stable')
+    boundaries = np.flatnonzero(np.diff(waves[order])) + 1
+    return np.split(order, boundaries)
+
+
+class Command(BaseCommand):
+    help = "Rebuild every player's rating and win/loss/draw counts by replaying finished games"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', choices=sorted(ENGINES),
+                            help='Rating engine to replay with (default: RATING_ENGINE)')
+        parser.add_argument('--dry-run', action='store_true', help='Compute without saving')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users per bulk update')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        User = get_user_model()
+        engine = get_rating_engine(options['engine'])
+
+        user_ids = list(User.objects.values_list('id', flat=True))
+        index = {user_id: i for i, user_id in enumerate(user_ids)}
+        games = (
+            Game.objects.filter(status='finished', result__in=list(RESULT_SCORES), player2__isnull=False)
+            .order_by('finished_at', 'created_at', 'id')
+            .values_list('player1_id', 'player2_id', 'result')
+        )
+        player1, player2, score = [], [], []
+        for player1_id, player2_id, result in games.iterator(chunk_size=10000):
+            player1.append(index[player1_id])
+            player2.append(index[player2_id])
+            score.append(RESULT_SCORES[result])
+        player1 = np.array(player1, dtype=np.int64)
+        player2 = np.array(player2, dtype=np.int64)
+        score = np.array(score, dtype=float)
+        loaded = time.monotonic()
+
+        rating, deviation, volatility = (
+            np.full(len(user_ids), value, dtype=float) for value in initial_ratings()
+        )
+        waves = rating_waves(player1, player2)
+        for wave in waves:
+            a, b = player1[wave], player2[wave]
+            new1, new2 = engine.rate(
+                Ratings(rating[a], deviation[a], volatility[a]),
+                Ratings(rating[b], deviation[b], volatility[b]),
+                score[wave]
+            )
+            rating[a], deviation[a], volatility[a] = new1
+            rating[b], deviation[b], volatility[b] = new2
+
+        def count(players, scores, value):
+            return np.bincount(players[scores == value], minlength=len(user_ids))
+
+        wins = count(player1, score, 1) + count(player2, score, 0)
+        losses = count(player1, score, 0) + count(player2, score, 1)
+        draws = count(player1, score, 0.5) + count(player2, score, 0.5)
+        rated = time.monotonic()
+
+        self.stdout.write(
+            f"Replayed {len(score)} games for {len(user_ids)} players in {len(waves)} waves "
+            f"(load {loaded - started:.2f}s, rate {rated - loaded:.2f}s)"
+        )
+        if options['dry_run']:
+            return
+
+        users = [
+            User(id=user_id, rating=int(rating[i]), rating_deviation=float(deviation[i]),
+                 rating_volatility=float(volatility[i]), wins=int(wins[i]), losses=int(losses[i]),
+                 draws=int(draws[i]))
+            for i, user_id in enumerate(user_ids)
+        ]
+        with transaction.atomic():
+            User.objects.bulk_update(
+                users, ['rating', 'rating_deviation', 'rating_volatility', 'wins', 'losses', 'draws'],
+                batch_size=options['batch_size']
+            )
+        ranked = get_leaderboard().rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved ratings for {len(users)} players and rebuilt the leaderboard ({ranked} ranked) "
+            f"in {time.monotonic() - rated:.2f}s"
+        ))
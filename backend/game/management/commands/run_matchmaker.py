@@ -0,0 +1,25 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from game.matchmaking import run_matchmaking_pass
+
+
+class Command(BaseCommand):
+    help = "Pair waiting players by rating in periodic batch passes (MATCHMAKING_BACKEND=rating)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single pass and exit')
+        parser.add_argument('--interval', type=float, default=settings.MATCHMAKING_PASS_INTERVAL,
+                            help='Seconds between passes')
+
+    def handle(self, *args, **options):
+        while True:
+            summary = run_matchmaking_pass()
+            if summary['matched'] or options['once']:
+                self.stdout.write(
+                    f"Matched {summary['matched']} pairs from {summary['waiting']} waiting "
+                    f"in {summary['duration_ms']} ms"
+                )
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,76 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the ASGI app (HTTP and WebSockets) from N uvicorn worker processes sharing one port. "
+        "Worker i runs as GAME_WORKER_ID=wi and owns the games that hash to it (game.ownership); "
+        "moves reaching any other worker are forwarded to the owner over the channel layer, "
+        "so CHANNEL_LAYERS must be shared (Redis) when N > 1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--log-level', default='info', help='uvicorn log level')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        # Bound once here and inherited, so the kernel spreads connections over the workers
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((options['host'], options['port']))
+        listener.listen(2048)
+        listener.set_inheritable(True)
+        fd = listener.fileno()
+
+        worker_ids = [f'w{i}' for i in range(options['workers'])]
+        command = [
+            sys.executable, '-m', 'uvicorn', 'game_backend.asgi:application',
+            '--fd', str(fd), '--lifespan', 'on', '--log-level', options['log_level'],
+            '--no-access-log', '--proxy-headers', '--forwarded-allow-ips', '*',
+        ]
+        workers = {}
+        for worker_id in worker_ids:
+            env = dict(os.environ, GAME_WORKER_ID=worker_id, GAME_WORKERS=','.join(worker_ids))
+            workers[worker_id] = subprocess.Popen(command, env=env, pass_fds=[fd])
+        self.stdout.write(
+            f"Started {len(workers)} workers ({', '.join(worker_ids)}) on {options['host']}:{options['port']}"
+        )
+
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+        exited = None
+        try:
+            while exited is None:
+                time.sleep(0.5)
+                exited = next((i for i, process in workers.items() if process.poll() is not None), None)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Workers flush their live games on shutdown (ASGI lifespan)
+            for process in workers.values():
+                if process.poll() is None:
+                    process.terminate()
+            for process in workers.values():
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            listener.close()
+
+        if exited is not None:
+            # A worker's games have no other owner: stop so the service is restarted as a whole
+            raise CommandError(f"Worker {exited} exited with code {workers[exited].returncode}")
+        self.stdout.write("Stopped all workers")
@@ -0,0 +1,326 @@
+"""Matchmaking: pair a player with a waiting game or queue a new one (settings.MATCHMAKING_BACKEND)."""
+import logging
+import time
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from utils.redis_client import get_redis
+from .models import Game
+from .broadcast import encode, notify_game_update, send_to_game_group
+from .versions import game_changed, game_deleted
+from . import lobby
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = 'active'
+MATCHED = 'matched'
+CREATED = 'created'
+
+
+def create_game_for_user(user, board_size=3, win_length=3):
+    """Helper: Create and initialize a new game for the given user"""
+    game = Game(player1=user, status='waiting', board_size=board_size, win_length=win_length)
+    game.initialize_board()
+    game.save()
+    transaction.on_commit(lambda: game_changed(game))
+    transaction.on_commit(lambda: lobby.game_opened(game))
+    return game
+
+
+def active_games(user):
+    """The user's waiting or in-progress games (served by the game_player*_status_idx indexes)"""
+    return Game.objects.filter(
+        Q(player1=user) | Q(player2=user),
+        status__in=['waiting', 'in_progress']
+    )
+
+
+def active_game_for(user):
+    """The user's waiting or in-progress game, if any"""
+    return active_games(user).first()
+
+
+def waiting_games(board_size, win_length):
+    """Open games with the given board settings, oldest first (served by game_waiting_idx)"""
+    return Game.objects.filter(
+        status='waiting', player2__isnull=True, board_size=board_size, win_length=win_length
+    ).order_by('created_at')
+
+
+def seat_player2(game, user):
+    """Atomically seat user as player 2 of a waiting game; False if it was already taken"""
+    now = timezone.now()
+    updated = Game.objects.filter(
+        id=game.id, status='waiting', player2__isnull=True
+    ).update(
+        player2=user,
+        current_turn_id=game.player1_id,  # Player 1 (X) always starts
+        status='in_progress',
+        version=F('version') + 1,
+        updated_at=now,
+    )
+    if not updated:
+        return False
+    game.player2 = user
+    game.current_turn_id = game.player1_id
+    game.status = 'in_progress'
+    game.version += 1
+    game.updated_at = now
+    transaction.on_commit(lambda: game_changed(game))
+    transaction.on_commit(lambda: lobby.game_matched(game))
+    return True
+
+
+class DatabaseMatchmaker:
+    def join(self, user, board_size=3, win_length=3):
+        """Return (game, ACTIVE | MATCHED | CREATED) for a player entering matchmaking"""
+        with transaction.atomic():
+            # Serialize concurrent requests from the same user so they can't queue twice
+            get_user_model().objects.select_for_update().filter(pk=user.pk).exists()
+
+            active_game = active_game_for(user)
+            if active_game:
+                return active_game, ACTIVE
+
+            game = self.claim_waiting_game(user, board_size, win_length)
+            if game:
+                metrics.record_match(
+                    waited=(timezone.now() - game.created_at).total_seconds(),
+                    gap=abs(user.rating - game.player1.rating)
+                )
+                return game, MATCHED
+
+            game = create_game_for_user(user, board_size, win_length)
+            transaction.on_commit(lambda: self.enqueue(game))
+            return game, CREATED
+
+    def claimable_games(self, user, board_size, win_length):
+        """Waiting games another player opened; locks only the game row, never its creator's user row"""
+        return (
+            waiting_games(board_size, win_length)
+            .select_for_update(skip_locked=True, of=('self',))
+            .exclude(player1=user)
+            .select_related('player1')
+        )
+
+    def claim_waiting_game(self, user, board_size, win_length):
+        game = self.claimable_games(user, board_size, win_length).first()
+        if game and seat_player2(game, user):
+            return game
+        return None
+
+    def enqueue(self, game):
+        """Make a waiting game available to joiners (rows are found by query here)"""
+
+
+class RedisMatchmaker(DatabaseMatchmaker):
+    def queue_key(self, board_size, win_length):
+        return f'matchmaking:{board_size}x{board_size}:{win_length}'
+
+    def join(self, user, board_size=3, win_length=3):
+        self.claimed = None
+        try:
+            return super().join(user, board_size, win_length)
+        except Exception:
+            # The seat was rolled back with the transaction; the popped game is still waiting
+            if self.claimed:
+                get_redis().lpush(*self.claimed)
+            raise
+
+    def claim_waiting_game(self, user, board_size, win_length):
+        redis = get_redis()
+        key = self.queue_key(board_size, win_length)
+        skipped = []
+        try:
+            while True:
+                entry = redis.lpop(key)
+                if entry is None:
+                    return None
+                game_id, player1_id = entry.decode().split(':')
+                if player1_id == str(user.id):
+                    skipped.append(entry)
+                    continue
+                game = Game.objects.select_related('player1').filter(id=game_id).first()
+                # Stale entries (cancelled, or matched with the bot) are dropped
+                if game and seat_player2(game, user):
+                    self.claimed = (key, entry)
+                    return game
+        finally:
+            if skipped:
+                redis.lpush(key, *reversed(skipped))
+
+    def enqueue(self, game):
+        get_redis().rpush(
+            self.queue_key(game.board_size, game.win_length),
+            f'{game.id}:{game.player1_id}'
+        )
+
+
+class RatingMatchmaker(DatabaseMatchmaker):
+    def claim_waiting_game(self, user, board_size, win_length):
+        """Never pair on request; run_matchmaking_pass pairs queued players by rating"""
+        return None
+
+
+BACKENDS = {
+    'database': DatabaseMatchmaker,
+    'redis': RedisMatchmaker,
+    'rating': RatingMatchmaker,
+}
+
+
+def get_matchmaker():
+    return BACKENDS[settings.MATCHMAKING_BACKEND]()
+
+
+# Rating-aware batch matching
+
+Ticket = namedtuple('Ticket', ['game_id', 'player_id', 'rating', 'waited'])
+
+
+def acceptable_gap(waited):
+    """Rating gap a player accepts after waiting `waited` seconds"""
+    return min(
+        settings.MATCHMAKING_INITIAL_GAP + settings.MATCHMAKING_GAP_GROWTH * waited,
+        settings.MATCHMAKING_MAX_GAP
+    )
+
+
+def pair_tickets(tickets):
+    """Pair tickets by rating, longest wait first, within both players' acceptable gaps; [(ticket, opponent, gap)]"""
+    size = settings.MATCHMAKING_BUCKET_SIZE
+    buckets = defaultdict(list)
+    for ticket in tickets:
+        buckets[ticket.rating // size].append(ticket)
+
+    paired = set()
+    pairs = []
+    for ticket in sorted(tickets, key=lambda t: t.waited, reverse=True):
+        if ticket.game_id in paired:
+            continue
+        window = acceptable_gap(ticket.waited)
+        best, best_gap = None, None
+        for bucket in range(int(ticket.rating - window) // size, int(ticket.rating + window) // size + 1):
+            for other in buckets.get(bucket, ()):
+                if other.game_id in paired or other.player_id == ticket.player_id:
+                    continue
+                gap = abs(other.rating - ticket.rating)
+                if gap <= min(window, acceptable_gap(other.waited)) and (best is None or gap < best_gap):
+                    best, best_gap = other, gap
+        if best is not None:
+            paired.update((ticket.game_id, best.game_id))
+            pairs.append((ticket, best, best_gap))
+    return pairs
+
+
+def run_matchmaking_pass():
+    """One batch pass over every waiting game; returns a summary dict"""
+    started = time.monotonic()
+    now = timezone.now()
+    queues = defaultdict(list)
+    waiting = Game.objects.filter(status='waiting', player2__isnull=True).values_list(
+        'id', 'player1_id', 'player1__rating', 'created_at', 'board_size', 'win_length'
+    )
+    for game_id, player_id, rating, created_at, board_size, win_length in waiting:
+        queues[board_size, win_length].append(
+            Ticket(game_id, player_id, rating, (now - created_at).total_seconds())
+        )
+
+    matched = 0
+    for tickets in queues.values():
+        for ticket, opponent, gap in pair_tickets(tickets):
+            if merge_waiting_games(ticket, opponent):
+                matched += 1
+                metrics.record_match(waited=ticket.waited, gap=gap)
+                metrics.record_match(waited=opponent.waited, gap=gap)
+
+    summary = {
+        'waiting': sum(len(tickets) for tickets in queues.values()),
+        'matched': matched,
+        'duration_ms': round((time.monotonic() - started) * 1000, 2),
+    }
+    metrics.record_pass(summary)
+    return summary
+
+
+def merge_waiting_games(ticket, opponent):
+    """Seat the opponent in the ticket's game and drop the opponent's own waiting game"""
+    with transaction.atomic():
+        deleted, _ = Game.objects.filter(
+            id=opponent.game_id, status='waiting', player2__isnull=True
+        ).delete()
+        game = Game.objects.select_related('player1').filter(id=ticket.game_id).first()
+        if not deleted or game is None:
+            transaction.set_rollback(True)
+            return False
+        player2 = get_user_model().objects.get(id=opponent.player_id)
+        if not seat_player2(game, player2):
+            transaction.set_rollback(True)
+            return False
+        transaction.on_commit(lambda: game_deleted(opponent.game_id, opponent.player_id))
+        transaction.on_commit(lambda: lobby.games_closed(opponent.game_id))
+
+    logger.info(f"[Matchmaker] {game.player1.username} vs {player2.username} in game {game.id}")
+    notify_game_update(game)
+    # Sockets still on the dropped game learn where the match is
+    send_to_game_group(opponent.game_id, encode({'type': 'matched', 'game_id': str(game.id)}))
+    return True
+
+
+class MatchmakingMetrics:
+    """Match latency / rating gap counters kept in the shared cache"""
+
+    PREFIX = 'matchmaking:metrics:'
+    LATENCY_BUCKETS = (5, 15, 30, 60, 120)
+    GAP_BUCKETS = (25, 50, 100, 200, 400)
+    TIMEOUT = None
+
+    def _incr(self, name, amount=1):
+        key = self.PREFIX + name
+        cache.add(key, 0, self.TIMEOUT)
+        cache.incr(key, amount)
+
+    @staticmethod
+    def _bucket(value, bounds):
+        for bound in bounds:
+            if value <= bound:
+                return f'le_{bound}'
+        return 'le_inf'
+
+    def record_match(self, waited, gap):
+        """Record one matched player: seconds waited and rating gap to the opponent"""
+        self._incr('players')
+        self._incr('latency_ms_sum', int(waited * 1000))
+        self._incr('gap_sum', int(gap))
+        self._incr('latency_' + self._bucket(waited, self.LATENCY_BUCKETS))
+        self._incr('gap_' + self._bucket(gap, self.GAP_BUCKETS))
+
+    def record_pass(self, summary):
+        cache.set(self.PREFIX + 'last_pass', summary, self.TIMEOUT)
+
+    def snapshot(self):
+        names = ['players', 'latency_ms_sum', 'gap_sum', 'last_pass']
+        names += ['latency_' + self._bucket(b, self.LATENCY_BUCKETS) for b in self.LATENCY_BUCKETS + (float('inf'),)]
+        names += ['gap_' + self._bucket(b, self.GAP_BUCKETS) for b in self.GAP_BUCKETS + (float('inf'),)]
+        values = cache.get_many([self.PREFIX + name for name in names])
+        get = lambda name: values.get(self.PREFIX + name, 0)
+        players = get('players')
+        return {
+            'matched_players': players,
+            'avg_match_latency_seconds': round(get('latency_ms_sum') / players / 1000, 3) if players else 0,
+            'avg_rating_gap': round(get('gap_sum') / players, 2) if players else 0,
+            'match_latency_seconds': {
+                name.split('_', 1)[1]: get(name) for name in names if name.startswith('latency_le')
+            },
+            'rating_gap': {
+                name.split('_', 1)[1]: get(name) for name in names if name.startswith('gap_le')
+            },
+            'last_pass': values.get(self.PREFIX + 'last_pass'),
+        }
+
+
+metrics = MatchmakingMetrics()
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-17 06:53
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="board_size",
+            field=models.PositiveSmallIntegerField(
+                default=3,
+                validators=[
+                    django.core.validators.MinValueValidator(3),
+                    django.core.validators.MaxValueValidator(19),
+                ],
+            ),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="win_length",
+            field=models.PositiveSmallIntegerField(
+                default=3,
+                validators=[
+                    django.core.validators.MinValueValidator(3),
+                    django.core.validators.MaxValueValidator(19),
+                ],
+            ),
+        ),
+    ]
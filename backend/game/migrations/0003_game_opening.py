@@ -0,0 +1,85 @@
+# Generated by Django 5.0.1 on 2026-10-17 06:56
+
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+# Frozen copy of game.symmetry.canonical_opening as of this migration
+
+
+def _transform(position, rotations, mirror):
+    row, col = divmod(position, 3)
+    if mirror:
+        col = 2 - col
+    for _ in range(rotations):
+        row, col = col, 2 - row
+    return row * 3 + col
+
+
+TRANSFORMS = tuple(
+    tuple(_transform(position, rotations, mirror) for position in range(9))
+    for mirror in (False, True)
+    for rotations in range(4)
+)
+
+
+def canonical_opening(positions, depth=3):
+    return min("".join(str(perm[position]) for position in positions[:depth]) for perm in TRANSFORMS)
+
+
+def positions_by_game(moves):
+    """(game_id, [position, ...]) per game from (game_id, position) rows ordered by game and move"""
+    for game_id, rows in groupby(moves.iterator(chunk_size=BATCH_SIZE), key=itemgetter(0)):
+        yield game_id, [position for _, position in rows]
+
+
+def update_in_batches(Game, games, fields):
+    batch = []
+    for game in games:
+        batch.append(game)
+        if len(batch) == BATCH_SIZE:
+            Game.objects.bulk_update(batch, fields)
+            batch = []
+    Game.objects.bulk_update(batch, fields)
+
+
+def backfill_openings(apps, schema_editor):
+    Game = apps.get_model("game", "Game")
+    Move = apps.get_model("game", "Move")
+    # One scan of the moves, grouped per game, instead of a query per game
+    moves = (
+        Move.objects.filter(game__status="finished", game__board_size=3, game__win_length=3)
+        .order_by("game_id", "move_number")
+        .values_list("game_id", "position")
+    )
+    games = (
+        Game(id=game_id, opening=canonical_opening(positions))
+        for game_id, positions in positions_by_game(moves)
+    )
+    update_in_batches(Game, games, ["opening"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0002_game_board_size_win_length"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="opening",
+            field=models.CharField(blank=True, default="", max_length=3),
+        ),
+        migrations.AddIndex(
+            model_name="game",
+            index=models.Index(fields=["opening", "result"], name="game_opening_result_idx"),
+        ),
+        migrations.RunPython(backfill_openings, migrations.RunPython.noop),
+    ]
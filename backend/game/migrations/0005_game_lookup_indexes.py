@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-17 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0004_game_version"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="game",
+            index=models.Index(
+                condition=models.Q(("player2__isnull", True), ("status", "waiting")),
+                fields=["board_size", "win_length", "created_at"],
+                name="game_waiting_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="game",
+            index=models.Index(fields=["player1", "status"], name="game_player1_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="game",
+            index=models.Index(fields=["player2", "status"], name="game_player2_status_idx"),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-17 07:11
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# The batched move scan of the opening backfill
+backfill = import_module("game.migrations.0003_game_opening")
+
+
+def encode_moves(positions):
+    """Frozen copy of game.game_logic.encode_moves as of this migration"""
+    return "".join(chr(ord("0") + position) for position in positions)
+
+
+def backfill_move_logs(apps, schema_editor):
+    Game = apps.get_model("game", "Game")
+    Move = apps.get_model("game", "Move")
+    moves = Move.objects.order_by("game_id", "move_number").values_list("game_id", "position")
+    games = (
+        Game(id=game_id, move_count=len(positions), move_log=encode_moves(positions))
+        for game_id, positions in backfill.positions_by_game(moves)
+    )
+    backfill.update_in_batches(Game, games, ["move_count", "move_log"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0005_game_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="move_count",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="move_log",
+            field=models.CharField(blank=True, default="", max_length=361),
+        ),
+        migrations.RunPython(backfill_move_logs, migrations.RunPython.noop),
+    ]
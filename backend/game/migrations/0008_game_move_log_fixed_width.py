@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-17 08:32
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# The batched updates of the opening backfill
+backfill = import_module("game.migrations.0003_game_opening")
+
+# Frozen copies of the game.game_logic move log encodings: 0006's one character per
+# move, and the fixed-width decimal positions that replace it
+OFFSET = ord("0")
+WIDTH = 3
+
+
+def reencode(apps, encode, decode):
+    Game = apps.get_model("game", "Game")
+    logs = Game.objects.exclude(move_log="").values_list("id", "move_log")
+    games = (
+        Game(id=game_id, move_log=encode(decode(move_log)))
+        for game_id, move_log in logs.iterator(chunk_size=backfill.BATCH_SIZE)
+    )
+    backfill.update_in_batches(Game, games, ["move_log"])
+
+
+def decode_characters(move_log):
+    return [ord(char) - OFFSET for char in move_log]
+
+
+def encode_characters(positions):
+    return "".join(chr(OFFSET + position) for position in positions)
+
+
+def decode_fixed_width(move_log):
+    return [int(move_log[i:i + WIDTH]) for i in range(0, len(move_log), WIDTH)]
+
+
+def encode_fixed_width(positions):
+    return "".join(f"{position:0{WIDTH}d}" for position in positions)
+
+
+def forwards(apps, schema_editor):
+    reencode(apps, encode_fixed_width, decode_characters)
+
+
+def backwards(apps, schema_editor):
+    reencode(apps, encode_characters, decode_fixed_width)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0007_game_history_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="game",
+            name="move_log",
+            field=models.CharField(blank=True, default="", max_length=1083),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.conf import settings
+from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
+from .game_logic import MIN_BOARD_SIZE, MAX_BOARD_SIZE, MOVE_LOG_WIDTH, decode_moves, get_geometry
+from .symmetry import OPENING_DEPTH
 
 class Game(models.Model):
     STATUS_CHOICES = [
@@ -17,11 +20,16 @@ class Game(models.Model):
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    player1 = models.ForeignKey("accounts.User", on_delete=models.CASCADE, 
+    # Indexed by the composite per-seat indexes in Meta, which all lead with the player
+    player1 = models.ForeignKey("accounts.User", on_delete=models.CASCADE, db_index=False,
                                 related_name='games_as_player1')
-    player2 = models.ForeignKey("accounts.User", on_delete=models.CASCADE, 
+    player2 = models.ForeignKey("accounts.User", on_delete=models.CASCADE, db_index=False,
                                 related_name='games_as_player2', null=True, blank=True)
     board_state = models.JSONField(default=list)
+    board_size = models.PositiveSmallIntegerField(
+        default=3, validators=[MinValueValidator(MIN_BOARD_SIZE), MaxValueValidator(MAX_BOARD_SIZE)])
+    win_length = models.PositiveSmallIntegerField(
+        default=3, validators=[MinValueValidator(MIN_BOARD_SIZE), MaxValueValidator(MAX_BOARD_SIZE)])
     current_turn = models.ForeignKey("accounts.User", on_delete=models.CASCADE,
                                      related_name='current_turn_games', null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
@@ -31,13 +39,44 @@ class Game(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     finished_at = models.DateTimeField(null=True, blank=True)
+    # Bumped on every state change; keys the cached broadcast state (game.broadcast)
+    version = models.PositiveIntegerField(default=0)
+    # Canonical (symmetry-reduced) first moves of a finished 3x3 game, see game.symmetry
+    opening = models.CharField(max_length=OPENING_DEPTH, blank=True, default='')
+    # Positions played so far, encoded by game_logic.encode_moves; Move rows are an optional audit copy
+    move_count = models.PositiveSmallIntegerField(default=0)
+    move_log = models.CharField(max_length=MAX_BOARD_SIZE ** 2 * MOVE_LOG_WIDTH, blank=True, default='')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['opening', 'result'], name='game_opening_result_idx'),
+            # Matchmaking: oldest waiting game with the requested board settings
+            models.Index(
+                fields=['board_size', 'win_length', 'created_at'],
+                condition=models.Q(status='waiting', player2__isnull=True),
+                name='game_waiting_idx',
+            ),
+            # Active game lookup, run on every create/join: one index per seat
+            models.Index(fields=['player1', 'status'], name='game_player1_status_idx'),
+            models.Index(fields=['player2', 'status'], name='game_player2_status_idx'),
+            # A player's game history, newest first, paged by (created_at, id) keyset cursors
+            models.Index(fields=['player1', 'created_at', 'id'], name='game_player1_created_idx'),
+            models.Index(fields=['player2', 'created_at', 'id'], name='game_player2_created_idx'),
+        ]
     
+    @property
+    def geometry(self):
+        return get_geometry(self.board_size, self.win_length)
+
+    @property
+    def positions(self):
+        """Positions played so far, in order"""
+        return decode_moves(self.move_log)
+
     def initialize_board(self):
     # just initialize the list; save later
-        self.board_state = [[None, None, None] for _ in range(3)]
+        self.board_state = self.geometry.empty_board()
 
 
 class Move(models.Model):
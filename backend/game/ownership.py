@@ -0,0 +1,45 @@
+"""Which worker process owns a game, by consistent hashing of the game id over GAME_WORKERS."""
+import bisect
+import hashlib
+from functools import lru_cache
+from django.conf import settings
+
+# Points per worker on the ring; more points spread games more evenly
+RING_REPLICAS = 64
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        points = sorted((_hash(f'{node}:{i}'), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key):
+        if not self._nodes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+@lru_cache(maxsize=None)
+def _ring(workers):
+    return HashRing(workers)
+
+
+def owner_of(game_id):
+    """Worker id owning a game, or None when the deployment is a single process"""
+    return _ring(tuple(settings.GAME_WORKERS)).owner(game_id)
+
+
+def is_local(game_id):
+    owner = owner_of(game_id)
+    return owner is None or owner == settings.GAME_WORKER_ID
+
+
+def worker_channel(worker_id):
+    """Channel layer channel a worker receives forwarded game commands on"""
+    return f'game-worker.{worker_id}'
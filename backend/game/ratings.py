@@ -0,0 +1,141 @@
+"""Pluggable player rating engines (elo, glicko2, fixed) on NumPy arrays, selected by settings.RATING_ENGINE."""
+from collections import namedtuple
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+# Per-player rating state; each field is an array with one element per game
+Ratings = namedtuple('Ratings', ['rating', 'deviation', 'volatility'])
+
+# Player 1's score for each rated result; abandoned games are not rated
+RESULT_SCORES = {'player1_win': 1.0, 'draw': 0.5, 'player2_win': 0.0}
+
+RATING_FIELDS = ('rating', 'rating_deviation', 'rating_volatility')
+
+
+class RatingEngine:
+    def rate(self, player1, player2, score):
+        """New (player1, player2) Ratings after games where player 1 scored `score`"""
+        new1, new2 = self.update(player1, player2, np.asarray(score, dtype=float))
+        return new1._replace(rating=np.rint(new1.rating)), new2._replace(rating=np.rint(new2.rating))
+
+    def update(self, player1, player2, score):
+        raise NotImplementedError
+
+
+class FixedEngine(RatingEngine):
+    WIN = 25
+    LOSS = -15
+    DRAW = 5
+
+    def _delta(self, rating, score):
+        return np.where(score == 1, rating + self.WIN,
+                        np.where(score == 0, np.maximum(rating + self.LOSS, 0), rating + self.DRAW))
+
+    def update(self, player1, player2, score):
+        return (player1._replace(rating=self._delta(player1.rating, score)),
+                player2._replace(rating=self._delta(player2.rating, 1 - score)))
+
+
+class EloEngine(RatingEngine):
+    def update(self, player1, player2, score):
+        k = settings.ELO_K_FACTOR
+        expected = 1 / (1 + 10 ** ((player2.rating - player1.rating) / 400))
+        change = k * (score - expected)
+        return (player1._replace(rating=player1.rating + change),
+                player2._replace(rating=player2.rating - change))
+
+
+class Glicko2Engine(RatingEngine):
+    SCALE = 173.7178
+    CENTER = 1500
+    EPSILON = 1e-6
+    MAX_ITERATIONS = 100
+
+    def update(self, player1, player2, score):
+        return (self._update_one(player1, player2, score),
+                self._update_one(player2, player1, 1 - score))
+
+    def _update_one(self, player, opponent, score):
+        """Glickman's Glicko-2 step for a rating period holding a single game, vectorized"""
+        tau = settings.GLICKO2_TAU
+        mu = (player.rating - self.CENTER) / self.SCALE
+        phi = player.deviation / self.SCALE
+        mu_j = (opponent.rating - self.CENTER) / self.SCALE
+        phi_j = opponent.deviation / self.SCALE
+
+        g = 1 / np.sqrt(1 + 3 * phi_j ** 2 / np.pi ** 2)
+        expected = 1 / (1 + np.exp(-g * (mu - mu_j)))
+        v = 1 / (g ** 2 * expected * (1 - expected))
+        delta = v * g * (score - expected)
+
+        # New volatility: root of f by the Illinois algorithm, on all games at once
+        a = np.log(player.volatility ** 2)
+
+        def f(x):
+            ex = np.exp(x)
+            return (ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2)
+                    - (x - a) / tau ** 2)
+
+        big_step = delta ** 2 > phi ** 2 + v
+        upper = np.log(np.where(big_step, delta ** 2 - phi ** 2 - v, 1))
+        k = np.ones_like(a)
+        searching = ~big_step & (f(a - k * tau) < 0)
+        while searching.any():
+            k = np.where(searching, k + 1, k)
+            searching &= f(a - k * tau) < 0
+        A = a
+        B = np.where(big_step, upper, a - k * tau)
+        fA, fB = f(A), f(B)
+        for _ in range(self.MAX_ITERATIONS):
+            active = np.abs(B - A) > self.EPSILON
+            if not active.any():
+                break
+            C = A + (A - B) * fA / (fB - fA)
+            fC = f(C)
+            crossed = fC * fB <= 0
+            A = np.where(active & crossed, B, A)
+            fA = np.where(active, np.where(crossed, fB, fA / 2), fA)
+            B = np.where(active, C, B)
+            fB = np.where(active, fC, fB)
+        volatility = np.exp(A / 2)
+
+        phi_star = np.sqrt(phi ** 2 + volatility ** 2)
+        new_phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+        new_mu = mu + new_phi ** 2 * g * (score - expected)
+        return Ratings(self.SCALE * new_mu + self.CENTER, self.SCALE * new_phi, volatility)
+
+
+ENGINES = {
+    'fixed': FixedEngine,
+    'elo': EloEngine,
+    'glicko2': Glicko2Engine,
+}
+
+
+def get_rating_engine(name=None):
+    return ENGINES[name or settings.RATING_ENGINE]()
+
+
+def initial_ratings():
+    """A new player's (rating, deviation, volatility): the User field defaults"""
+    fields = get_user_model()._meta
+    return tuple(fields.get_field(name).get_default() for name in RATING_FIELDS)
+
+
+def rate_game(player1, player2, result):
+    """New rating fields for two users after one game, as update() kwargs; None for unrated results"""
+    score = RESULT_SCORES.get(result)
+    if score is None:
+        return None
+
+    def state(user):
+        return Ratings(*(np.array([getattr(user, name)], dtype=float) for name in RATING_FIELDS))
+
+    new1, new2 = get_rating_engine().rate(state(player1), state(player2), [score])
+
+    def fields(new):
+        return {'rating': int(new.rating[0]), 'rating_deviation': float(new.deviation[0]),
+                'rating_volatility': float(new.volatility[0])}
+
+    return fields(new1), fields(new2)
@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     path('ws/game/<uuid:game_id>/', consumers.GameConsumer.as_asgi()),
+    path('ws/lobby/', consumers.LobbyConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,6 +1,8 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Game, Move
-from accounts.serializers.user_serializer import UserSerializer
+from .game_logic import MIN_BOARD_SIZE, MAX_BOARD_SIZE
+from accounts.serializers.user_serializer import UserSerializer, UserSummarySerializer
 
 class MoveSerializer(serializers.ModelSerializer):
     player = UserSerializer(read_only=True)
@@ -15,9 +17,41 @@ class GameSerializer(serializers.ModelSerializer):
     current_turn = UserSerializer(read_only=True)
     winner = UserSerializer(read_only=True)
     moves = MoveSerializer(many=True, read_only=True)
+    positions = serializers.ListField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Game
-        fields = ['id', 'player1', 'player2', 'board_state', 'current_turn',
+        fields = ['id', 'player1', 'player2', 'board_state', 'board_size',
+                  'win_length', 'current_turn',
                   'status', 'winner', 'result', 'created_at', 'updated_at',
-                  'finished_at', 'moves']
\ No newline at end of file
+                  'finished_at', 'move_count', 'positions', 'moves']
+
+class GameSummarySerializer(serializers.ModelSerializer):
+    """Game listing without board, moves or player stats"""
+    player1 = UserSummarySerializer(read_only=True)
+    player2 = UserSummarySerializer(read_only=True)
+    winner = UserSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Game
+        fields = ['id', 'player1', 'player2', 'board_size', 'win_length', 'status',
+                  'winner', 'result', 'move_count', 'created_at', 'finished_at']
+
+GAME_PLAYERS = ('player1', 'player2', 'current_turn', 'winner')
+
+def moves_with_players():
+    return Prefetch('moves', queryset=Move.objects.select_related('player'))
+
+def with_game_details(queryset):
+    """Load everything GameSerializer renders in two queries, however many games and moves"""
+    return queryset.select_related(*GAME_PLAYERS).prefetch_related(moves_with_players())
+
+class GameSettingsSerializer(serializers.Serializer):
+    """Optional board settings accepted when creating or matching a game"""
+    board_size = serializers.IntegerField(min_value=MIN_BOARD_SIZE, max_value=MAX_BOARD_SIZE, default=3)
+    win_length = serializers.IntegerField(min_value=MIN_BOARD_SIZE, max_value=MAX_BOARD_SIZE, default=3)
+
+    def validate(self, attrs):
+        if attrs['win_length'] > attrs['board_size']:
+            raise serializers.ValidationError({'win_length': 'Cannot be larger than board_size.'})
+        return attrs
@@ -0,0 +1,87 @@
+"""Perfect-play solver for the classic 3x3 game, precomputed into flat arrays indexed by board code."""
+from array import array
+
+from .game_logic import FULL_MASK, WINNING_MASKS
+
+POSITION_COUNT = 3 ** 9
+NO_MOVE = -1
+UNSOLVED = -128
+
+# TERNARY[mask] is the base-3 code of mask with each set bit as digit 1
+TERNARY = tuple(
+    sum(3 ** bit for bit in range(9) if mask >> bit & 1)
+    for mask in range(FULL_MASK + 1)
+)
+
+_table = None
+
+
+def position_index(x_mask, o_mask):
+    """Base-3 board code: 0 = empty, 1 = X, 2 = O per cell"""
+    return TERNARY[x_mask] + 2 * TERNARY[o_mask]
+
+
+class SolvedTable:
+    """Best move and negamax score for every reachable position"""
+
+    def __init__(self):
+        self.moves = array('b', [NO_MOVE]) * POSITION_COUNT
+        self.scores = array('b', [UNSOLVED]) * POSITION_COUNT
+        self.reachable = 0
+        self._solve(0, 0)
+
+    def _solve(self, x_mask, o_mask):
+        """Score for the side to move: > 0 wins, 0 draws, < 0 loses"""
+        index = position_index(x_mask, o_mask)
+        score = self.scores[index]
+        if score != UNSOLVED:
+            return score
+        self.reachable += 1
+
+        occupied = x_mask | o_mask
+        empty = 9 - bin(occupied).count('1')
+        x_to_move = empty % 2 == 1
+        opponent = o_mask if x_to_move else x_mask
+
+        if WINNING_MASKS[opponent]:
+            # Lost; losing later (fewer empty cells) is less bad
+            score = -1 - empty
+        elif occupied == FULL_MASK:
+            score = 0
+        else:
+            score = UNSOLVED
+            for position in range(9):
+                bit = 1 << position
+                if occupied & bit:
+                    continue
+                if x_to_move:
+                    child = -self._solve(x_mask | bit, o_mask)
+                else:
+                    child = -self._solve(x_mask, o_mask | bit)
+                if child > score:
+                    score = child
+                    self.moves[index] = position
+
+        self.scores[index] = score
+        return score
+
+    def best_move(self, x_mask, o_mask):
+        """Best position (0-8) for the side to move, or NO_MOVE if the game is over"""
+        return self.moves[position_index(x_mask, o_mask)]
+
+    def score(self, x_mask, o_mask):
+        """Negamax score for the side to move"""
+        return self.scores[position_index(x_mask, o_mask)]
+
+
+def get_table():
+    """The solved table, built on first use (done at startup by GameConfig.ready)"""
+    global _table
+    if _table is None:
+        _table = SolvedTable()
+    return _table
+
+
+def best_move(x_mask, o_mask):
+    """O(1) perfect-play move lookup for the side to move"""
+    return get_table().best_move(x_mask, o_mask)
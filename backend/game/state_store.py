@@ -0,0 +1,287 @@
+"""Authoritative in-memory state of in-progress games, flushed in batches and by a game's actor when it ends."""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Game, Move
+from .game_logic import encode_moves
+from .finalization import finalize_game
+from .symmetry import canonical_opening
+from .versions import record_game_changes
+
+logger = logging.getLogger(__name__)
+
+Player = namedtuple('Player', ['id', 'username', 'is_bot'])
+
+PendingMove = namedtuple('PendingMove', ['game_id', 'player_id', 'position', 'move_number'])
+
+
+class MoveError(Exception):
+    """A move was rejected; the message is sent back to the player"""
+
+
+class FlushError(Exception):
+    """Some games could not be written and were queued again; the rest of the batch was"""
+
+
+class GameGone(Exception):
+    """The row of a live game was deleted (directly or with a player)"""
+
+# Longest wait between retries of a write-behind flush that keeps failing
+MAX_FLUSH_BACKOFF = 30
+
+
+class LiveGame:
+    """Authoritative in-memory state of one in-progress game"""
+
+    def __init__(self, game):
+        self.id = game.id
+        self.player1 = Player(game.player1.id, game.player1.username, game.player1.is_bot)
+        self.player2 = Player(game.player2.id, game.player2.username, game.player2.is_bot)
+        self.geometry = game.geometry
+        self.board_size = game.board_size
+        self.win_length = game.win_length
+        self.x_mask, self.o_mask = self.geometry.from_board(game.board_state)
+        self.current_turn = self.player1 if game.current_turn_id == self.player1.id else self.player2
+        self.status = game.status
+        self.winner = None
+        self.result = None
+        self.finished_at = None
+        self.moves = game.positions
+        self.version = game.version
+        self.touched_at = time.monotonic()
+        self.flush_failures = 0
+
+    @property
+    def board_state(self):
+        return self.geometry.to_board(self.x_mask, self.o_mask)
+
+    def apply_move(self, user_id, position):
+        """Validate and apply a move in memory; raises MoveError if rejected"""
+        if self.status != 'in_progress':
+            raise MoveError('Game is not in progress')
+        if self.current_turn.id != user_id:
+            raise MoveError('Not your turn')
+        if not self.geometry.is_valid_move(self.x_mask, self.o_mask, position):
+            raise MoveError('Invalid move')
+
+        if self.current_turn is self.player1:
+            self.x_mask |= 1 << position
+            player_mask = self.x_mask
+        else:
+            self.o_mask |= 1 << position
+            player_mask = self.o_mask
+        self.moves.append(position)
+        self.version += 1
+        self.touched_at = time.monotonic()
+
+        # Only lines through the new stone can have changed
+        if self.geometry.is_win_at(player_mask, position):
+            self.status = 'finished'
+            self.winner = self.current_turn
+            self.result = 'player1_win' if self.winner is self.player1 else 'player2_win'
+            self.finished_at = timezone.now()
+        elif self.geometry.is_board_full(self.x_mask, self.o_mask):
+            self.status = 'finished'
+            self.result = 'draw'
+            self.finished_at = timezone.now()
+        else:
+            self.current_turn = self.player2 if self.current_turn is self.player1 else self.player1
+
+    def db_fields(self):
+        """Game columns to persist for the current state"""
+        fields = {
+            'board_state': self.board_state,
+            'current_turn_id': self.current_turn.id,
+            'status': self.status,
+            'version': self.version,
+            'move_count': len(self.moves),
+            'move_log': encode_moves(self.moves),
+            'updated_at': timezone.now(),
+        }
+        if self.status == 'finished':
+            fields.update(
+                winner_id=self.winner.id if self.winner else None,
+                result=self.result,
+                finished_at=self.finished_at,
+            )
+            if self.board_size == 3 and self.win_length == 3:
+                # Index the finished game by its symmetry-reduced opening
+                fields['opening'] = canonical_opening(self.moves)
+        return fields
+
+
+class GameStateStore:
+    """Live games keyed by game id plus the write-behind queue of their moves"""
+
+    def __init__(self):
+        self.games = {}
+        self._pending_moves = []
+        self._dirty = {}
+        self._queued = 0  # moves applied since the last flush, audited or not
+        self._lock = threading.Lock()
+        self._flush_task = None
+        self._flush_failures = 0
+
+    def get(self, game_id):
+        return self.games.get(game_id)
+
+    def load(self, game_id):
+        """Load an in-progress game from the database (sync); None if not in progress"""
+        live = self.games.get(game_id)
+        if live is not None:
+            return live
+        game = Game.objects.select_related('player1', 'player2').get(id=game_id)
+        if game.status != 'in_progress':
+            return None
+        live = LiveGame(game)
+        with self._lock:
+            # Another thread may have loaded it meanwhile; keep the first copy
+            return self.games.setdefault(game_id, live)
+
+    async def aload(self, game_id):
+        live = self.games.get(game_id)
+        if live is None:
+            live = await database_sync_to_async(self.load)(game_id)
+        return live
+
+    def apply_move(self, live, user_id, position):
+        """Apply a move to a live game and queue it for persistence; returns the queued move count"""
+        with self._lock:
+            live.apply_move(user_id, position)
+            if settings.GAME_AUDIT_MOVES:
+                self._pending_moves.append(PendingMove(live.id, user_id, position, len(live.moves)))
+            self._dirty[live.id] = live
+            self._queued += 1
+            return self._queued
+
+    def flush(self):
+        """Write queued moves and game rows, one savepoint per game; settle finished games"""
+        with self._lock:
+            moves, self._pending_moves = self._pending_moves, []
+            dirty, self._dirty = self._dirty, {}
+            queued, self._queued = self._queued, 0
+            snapshots = [(live, live.db_fields()) for live in dirty.values()]
+        if not moves and not snapshots:
+            return
+
+        moves_by_game = defaultdict(list)
+        for move in moves:
+            moves_by_game[move.game_id].append(move)
+        changes = []
+        failed = []
+        try:
+            with transaction.atomic():
+                for live, fields in snapshots:
+                    try:
+                        # One bad game must not hold back the others
+                        with transaction.atomic():
+                            change = self._write(live, fields, moves_by_game[live.id])
+                    except Exception as e:
+                        failed.append((live, e))
+                        continue
+                    live.flush_failures = 0
+                    if change:
+                        changes.append(change)
+                transaction.on_commit(lambda: record_game_changes(changes))
+        except Exception:
+            # The batch as a whole failed (e.g. the database is unreachable): put it all back
+            with self._lock:
+                self._pending_moves[:0] = moves
+                self._queued += queued
+                for live, _ in snapshots:
+                    self._dirty.setdefault(live.id, live)
+            raise
+
+        failed_ids = {live.id for live, _ in failed}
+        with self._lock:
+            for live, fields in snapshots:
+                if fields['status'] == 'finished' and live.id not in failed_ids:
+                    self.games.pop(live.id, None)
+            requeued = [live for live, error in failed if self._requeue(live, error, moves_by_game[live.id])]
+            self._evict_idle()
+        logger.debug(f"Flushed {queued} moves for {len(snapshots) - len(failed)} games")
+        if requeued:
+            raise FlushError(f"{len(requeued)} games could not be flushed and are queued again")
+
+    def _write(self, live, fields, moves):
+        """Persist one game and its audit moves; returns its change for record_game_changes, if any"""
+        if fields['status'] == 'finished':
+            if not finalize_game(live.id, live.player1.id, live.player2.id, **fields):
+                if not Game.objects.filter(id=live.id).exists():
+                    raise GameGone(live.id)
+            change = None  # finalize_game records its own change
+        else:
+            if not Game.objects.filter(id=live.id).update(**fields):
+                raise GameGone(live.id)
+            change = (live.id, fields['version'], (live.player1.id, live.player2.id))
+        # After the row check: foreign keys are only enforced at commit, for the whole batch
+        Move.objects.bulk_create([
+            Move(game_id=m.game_id, player_id=m.player_id, position=m.position, move_number=m.move_number)
+            for m in moves
+        ])
+        return change
+
+    def _requeue(self, live, error, moves):
+        """Queue a game that failed to flush again, or drop it; True if queued (call with the lock held)"""
+        if isinstance(error, GameGone):
+            logger.error(f"Live game {live.id} no longer exists; dropping its {len(moves)} unsaved moves")
+            self.games.pop(live.id, None)
+            return False
+        live.flush_failures += 1
+        if live.flush_failures >= settings.GAME_FLUSH_MAX_ATTEMPTS:
+            logger.critical(
+                f"Live game {live.id} failed to flush {live.flush_failures} times; "
+                f"dropping it with {len(moves)} unsaved moves: {error}", exc_info=error
+            )
+            self.games.pop(live.id, None)
+            return False
+        logger.warning(f"Flushing live game {live.id} failed (attempt {live.flush_failures}): {error}")
+        self._pending_moves[:0] = moves
+        self._queued += max(len(moves), 1)
+        self._dirty.setdefault(live.id, live)
+        return True
+
+    async def aflush(self):
+        await database_sync_to_async(self.flush)()
+
+    def schedule_flush(self, pending_count):
+        """Flush soon from the running event loop, or right away once the batch is full"""
+        loop = asyncio.get_running_loop()
+        task = self._flush_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            if pending_count < settings.GAME_FLUSH_BATCH_SIZE:
+                return
+        delay = 0 if pending_count >= settings.GAME_FLUSH_BATCH_SIZE else settings.GAME_FLUSH_INTERVAL
+        self._flush_task = loop.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        try:
+            await self.aflush()
+        except Exception as e:
+            # What failed was queued again; retry with exponential backoff
+            self._flush_failures += 1
+            retry = min(settings.GAME_FLUSH_INTERVAL * 2 ** self._flush_failures, MAX_FLUSH_BACKOFF)
+            logger.error(
+                f"Write-behind flush failed ({self._flush_failures} in a row), retrying in {retry}s: {e}",
+                exc_info=not isinstance(e, FlushError)
+            )
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later(retry))
+        else:
+            self._flush_failures = 0
+
+    def _evict_idle(self):
+        """Drop games nobody has touched for a while; their state is already flushed"""
+        cutoff = time.monotonic() - settings.GAME_IDLE_TIMEOUT
+        for game_id in [g for g, live in self.games.items()
+                        if live.touched_at < cutoff and g not in self._dirty]:
+            del self.games[game_id]
+
+
+store = GameStateStore()
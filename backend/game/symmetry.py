@@ -0,0 +1,72 @@
+"""Symmetry canonicalization for the classic 3x3 board, by precomputed permutation and mask tables."""
+from .game_logic import FULL_MASK, BitBoard
+from .solver import position_index
+
+# Moves kept in Game.opening
+OPENING_DEPTH = 3
+
+
+def _transform(row, col, rotations, mirror):
+    if mirror:
+        col = 2 - col
+    for _ in range(rotations):
+        row, col = col, 2 - row
+    return row * 3 + col
+
+
+# TRANSFORMS[t][position] is where position moves under transform t; t = 0 is the identity
+TRANSFORMS = tuple(
+    tuple(_transform(position // 3, position % 3, rotations, mirror) for position in range(9))
+    for mirror in (False, True)
+    for rotations in range(4)
+)
+
+INVERSE_TRANSFORMS = tuple(
+    tuple(perm.index(position) for position in range(9))
+    for perm in TRANSFORMS
+)
+
+# PERMUTED_MASKS[t][mask] is mask with every bit moved by transform t
+PERMUTED_MASKS = tuple(
+    tuple(
+        sum(1 << perm[bit] for bit in range(9) if mask >> bit & 1)
+        for mask in range(FULL_MASK + 1)
+    )
+    for perm in TRANSFORMS
+)
+
+
+def canonicalize(x_mask, o_mask):
+    """Return (canonical_x, canonical_o, transform) for a pair of bitboards"""
+    best = None
+    for transform, table in enumerate(PERMUTED_MASKS):
+        x_t, o_t = table[x_mask], table[o_mask]
+        index = position_index(x_t, o_t)
+        if best is None or index < best[0]:
+            best = (index, x_t, o_t, transform)
+    return best[1], best[2], best[3]
+
+
+def canonical_board(board):
+    """Return (canonical JSON board, transform) for a 3x3 JSON board"""
+    x_mask, o_mask, transform = canonicalize(*BitBoard.from_board(board))
+    return BitBoard.to_board(x_mask, o_mask), transform
+
+
+def apply_transform(position, transform):
+    """Map a position onto the canonical board"""
+    return TRANSFORMS[transform][position]
+
+
+def invert_transform(position, transform):
+    """Map a position on the canonical board back onto the original board"""
+    return INVERSE_TRANSFORMS[transform][position]
+
+
+def canonical_opening(positions, depth=OPENING_DEPTH):
+    """Smallest symmetric variant of the first `depth` moves as a key, e.g. [8, 4, 0] -> '048'"""
+    opening = positions[:depth]
+    return min(
+        ''.join(str(perm[position]) for position in opening)
+        for perm in TRANSFORMS
+    )
@@ -1,14 +1,59 @@
+import asyncio
 import json
-from django.test import TestCase
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+import numpy as np
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
+from redis.exceptions import RedisError
+from accounts.middleware import JWTAuthMiddleware
+from utils.redis_client import get_redis
 from .models import Game, Move
+from .routing import websocket_urlpatterns
+from .state_store import FlushError, GameStateStore, store
+from . import actors, benchmarks
+from .ownership import HashRing, owner_of
+from .finalization import finalize_game
+from .ratings import Ratings, get_rating_engine
+from .management.commands.recompute_ratings import rating_waves
+from .broadcast import game_state, game_state_message
+from .event_log import EventLog
+from .matchmaking import (
+    ACTIVE, CREATED, MATCHED, DatabaseMatchmaker, RatingMatchmaker, RedisMatchmaker, Ticket, active_games,
+    create_game_for_user, metrics, pair_tickets, run_matchmaking_pass, seat_player2, waiting_games
+)
+from .solver import get_table, best_move, NO_MOVE
+from .bot import get_bot_user
+from .symmetry import canonicalize, canonical_board, canonical_opening, invert_transform, PERMUTED_MASKS
+from .game_logic import (
+    BitBoard, TicTacToeLogic, WINNING_MASKS, WIN_MASKS, FULL_MASK, MAX_BOARD_SIZE, BoardGeometry,
+    decode_moves, encode_moves, get_geometry
+)
 
 User = get_user_model()
 
 
+def redis_available():
+    try:
+        return get_redis().ping()
+    except RedisError:
+        return False
+
+
 class GameAPITestCase(APITestCase):
     def setUp(self):
         """Set up test users and authentication"""
@@ -81,6 +126,161 @@ class GameAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreater(len(response.data), 0)
 
+    def test_create_game_with_board_size(self):
+        """Test creating a gomoku-style game and rejecting bad settings"""
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('game:create-game')
+        response = self.client.post(url, {'board_size': 3, 'win_length': 4})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, {'board_size': 15, 'win_length': 5})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['board_size'], 15)
+        self.assertEqual(response.data['win_length'], 5)
+        self.assertEqual(len(response.data['board_state']), 15)
+
+    @override_settings(
+        BOT_MATCHMAKING_TIMEOUT=30,
+        CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    )
+    def test_matchmaking_falls_back_to_bot(self):
+        """Test a player left waiting past the timeout is matched with the bot"""
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('game:join-matchmaking')
+        response = self.client.post(url)
+        game_id = response.data['id']
+
+        response = self.client.post(url)
+        self.assertEqual(response.data['status'], 'waiting')
+
+        Game.objects.filter(id=game_id).update(created_at=timezone.now() - timedelta(seconds=31))
+        response = self.client.post(url)
+
+        self.assertEqual(response.data['id'], game_id)
+        self.assertEqual(response.data['status'], 'in_progress')
+        self.assertEqual(response.data['player2']['username'], get_bot_user().username)
+        self.assertEqual(response.data['current_turn']['username'], 'testuser1')
+
+    def test_opening_stats(self):
+        """Test opening stats group symmetric openings together"""
+        for opening, result in (('048', 'player1_win'), ('048', 'draw'), ('01', 'player2_win')):
+            Game.objects.create(player1=self.user1, player2=self.user2, status='finished',
+                                opening=opening, result=result)
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('game:opening-stats')
+        # 2, 4, 6 is a reflection of 0, 4, 8
+        response = self.client.get(url, {'moves': '2,4,6'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['opening'], '048')
+        self.assertEqual(response.data['games'], 2)
+        self.assertEqual(response.data['player1_win_rate'], 50.0)
+
+        response = self.client.get(url, {'moves': '0,0'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def play_games(self, count, moves=5):
+        for _ in range(count):
+            game = Game.objects.create(player1=self.user1, player2=self.user2, status='finished',
+                                       winner=self.user1, result='player1_win')
+            for number in range(moves):
+                Move.objects.create(game=game, player=(self.user1, self.user2)[number % 2],
+                                    position=number, move_number=number + 1)
+        return game
+
+    def test_game_views_use_constant_queries(self):
+        """Test game lists and details cost the same number of queries at any size"""
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('game:my-games')
+        self.play_games(1, moves=1)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        game = self.play_games(10)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 11)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('game:game-detail', kwargs={'game_id': game.id}))
+        self.assertEqual(len(response.data['moves']), 5)
+
+    def test_my_games_cursor_pages(self):
+        """Test cursor pages cover every game once, newest first, across both seats"""
+        self.play_games(3, moves=0)
+        for _ in range(4):
+            Game.objects.create(player1=self.user2, player2=self.user1, status='finished')
+        # Ties on created_at are broken by id
+        Game.objects.filter(player1=self.user2).update(created_at=timezone.now())
+        self.client.force_authenticate(user=self.user1)
+
+        seen = []
+        response = self.client.get(reverse('game:my-games'), {'page_size': 3, 'fields': 'summary'})
+        while True:
+            results = response.data['results']
+            self.assertLessEqual(len(results), 3)
+            self.assertNotIn('moves', results[0])
+            self.assertEqual(set(results[0]['player1']), {'id', 'username'})
+            seen.extend(results)
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        expected = Game.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual([game['id'] for game in seen], [str(game_id) for game_id in expected])
+        response = self.client.get(reverse('game:my-games'), {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_game_detail_conditional_get(self):
+        """Test an unchanged game is answered with 304 without queries, a changed one in full"""
+        self.client.force_authenticate(user=self.user1)
+        game = Game.objects.create(player1=self.user1, status='waiting')
+        url = reverse('game:game-detail', kwargs={'game_id': game.id})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        # Dates are not validators here: a change within the same second would be missed
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for change in (lambda: seat_player2(game, self.user2),
+                       lambda: finalize_game(game.id, self.user1.id, self.user2.id, 'draw')):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_my_games_conditional_get(self):
+        """Test the games list revalidates until one of the user's games changes"""
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('game:my-games')
+        self.play_games(2)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Each page has its own validator
+        response = self.client.get(url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_game_for_user(self.user1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
     def test_unauthorized_access(self):
         """Test that unauthenticated requests are rejected"""
         url = reverse('game:create_game')
@@ -143,3 +343,894 @@ class MoveModelTestCase(TestCase):
         self.assertEqual(move.player, self.user1)
         self.assertEqual(move.position, 0)
         self.assertEqual(move.move_number, 1)
+
+
+class BitBoardTestCase(SimpleTestCase):
+    def test_board_round_trip(self):
+        """Test conversion between JSON boards and bitmasks"""
+        board = [['X', None, 'O'], [None, 'X', None], ['O', None, None]]
+        x_mask, o_mask = BitBoard.from_board(board)
+
+        self.assertEqual(x_mask, 0b000010001)
+        self.assertEqual(o_mask, 0b001000100)
+        self.assertEqual(BitBoard.to_board(x_mask, o_mask), board)
+
+    def test_matches_list_logic(self):
+        """Test bitboard results agree with TicTacToeLogic on every board"""
+        for code in range(3 ** 9):
+            cells = []
+            for _ in range(9):
+                code, cell = divmod(code, 3)
+                cells.append((None, 'X', 'O')[cell])
+            board = [cells[0:3], cells[3:6], cells[6:9]]
+            x_mask, o_mask = BitBoard.from_board(board)
+            if WINNING_MASKS[x_mask] and WINNING_MASKS[o_mask]:
+                continue  # both sides winning can't happen in play
+
+            self.assertEqual(BitBoard.check_winner(x_mask, o_mask),
+                             TicTacToeLogic.check_winner(board))
+            self.assertEqual(BitBoard.is_board_full(x_mask, o_mask),
+                             TicTacToeLogic.is_board_full(board))
+
+    def test_is_valid_move(self):
+        """Test occupied, out-of-range and non-integer positions are rejected"""
+        x_mask, o_mask = 0b1, 0b10
+
+        self.assertTrue(BitBoard.is_valid_move(x_mask, o_mask, 2))
+        self.assertFalse(BitBoard.is_valid_move(x_mask, o_mask, 0))
+        self.assertFalse(BitBoard.is_valid_move(x_mask, o_mask, 1))
+        self.assertFalse(BitBoard.is_valid_move(x_mask, o_mask, 9))
+        self.assertFalse(BitBoard.is_valid_move(x_mask, o_mask, -1))
+        self.assertFalse(BitBoard.is_valid_move(x_mask, o_mask, None))
+
+
+class BoardGeometryTestCase(SimpleTestCase):
+    def test_classic_board_lines(self):
+        """Test 3x3 geometry has the 8 classic lines"""
+        geometry = get_geometry(3, 3)
+
+        self.assertEqual(sorted(geometry.lines), sorted(WIN_MASKS))
+        self.assertEqual(len(geometry.lines_through[4]), 4)
+        self.assertEqual(len(geometry.lines_through[1]), 2)
+
+    def test_incremental_win_on_large_board(self):
+        """Test five in a row is detected from the last stone on 15x15"""
+        geometry = get_geometry(15, 5)
+        diagonal = [geometry.coords_to_position(3 + i, 10 - i) for i in range(5)]
+        mask = 0
+        for position in diagonal[:4]:
+            mask |= 1 << position
+            self.assertFalse(geometry.is_win_at(mask, position))
+
+        mask |= 1 << diagonal[4]
+        self.assertTrue(geometry.is_win_at(mask, diagonal[4]))
+        self.assertEqual(geometry.check_winner(mask, 0), 'X')
+
+    def test_board_conversion(self):
+        """Test JSON boards round-trip on non-square-of-three sizes"""
+        geometry = get_geometry(4, 3)
+        board = geometry.empty_board()
+        board[3][1] = 'O'
+        board[0][2] = 'X'
+        x_mask, o_mask = geometry.from_board(board)
+
+        self.assertEqual(x_mask, 1 << 2)
+        self.assertEqual(o_mask, 1 << 13)
+        self.assertEqual(geometry.to_board(x_mask, o_mask), board)
+        self.assertEqual(geometry.position_to_coords(13), (3, 1))
+
+    def test_move_log_encoding(self):
+        """Test move logs are fixed-width ASCII digits up to the largest board"""
+        positions = [4, 0, 9, 10, MAX_BOARD_SIZE ** 2 - 1]
+        move_log = encode_moves(positions)
+
+        self.assertEqual(move_log, '004000009010360')
+        self.assertEqual(decode_moves(move_log), positions)
+        self.assertEqual(decode_moves(''), [])
+
+    def test_invalid_settings(self):
+        """Test win length longer than the board is rejected"""
+        with self.assertRaises(ValueError):
+            BoardGeometry(3, 4)
+
+
+class SolverTestCase(SimpleTestCase):
+    def test_table_covers_reachable_positions(self):
+        """Test every reachable 3x3 position is solved and the game is a draw"""
+        table = get_table()
+
+        self.assertEqual(table.reachable, 5478)
+        self.assertEqual(table.score(0, 0), 0)
+        self.assertEqual(best_move(0b111, 0b11000), NO_MOVE)
+
+    def test_takes_immediate_win_and_blocks(self):
+        """Test the bot completes its own line before blocking"""
+        # X: 0, 1, 6  O: 3, 4 -> O to move wins at 5
+        self.assertEqual(best_move(0b001000011, 0b000011000), 5)
+        # X: 0, 1  O: 4 -> O must block at 2
+        self.assertEqual(best_move(0b000000011, 0b000010000), 2)
+
+    def test_never_loses(self):
+        """Test the solver as O never loses against any sequence of X moves"""
+        def play(x_mask, o_mask):
+            for position in range(9):
+                if (x_mask | o_mask) >> position & 1:
+                    continue
+                x_next = x_mask | 1 << position
+                self.assertFalse(WINNING_MASKS[x_next])
+                if x_next | o_mask == FULL_MASK:
+                    continue
+                o_next = o_mask | 1 << best_move(x_next, o_mask)
+                if not WINNING_MASKS[o_next]:
+                    play(x_next, o_next)
+
+        play(0, 0)
+
+
+class SymmetryTestCase(SimpleTestCase):
+    def test_all_symmetric_boards_share_canonical_form(self):
+        """Test every transform of a board canonicalizes to the same form"""
+        x_mask, o_mask = BitBoard.from_board([['X', 'O', None], [None, 'X', None], [None, None, None]])
+        canonical = {canonicalize(table[x_mask], table[o_mask])[:2] for table in PERMUTED_MASKS}
+
+        self.assertEqual(len(canonical), 1)
+
+    def test_transform_maps_back_to_original(self):
+        """Test the returned transform maps canonical positions back"""
+        board = [[None, None, 'X'], [None, 'O', None], [None, None, None]]
+        canonical, transform = canonical_board(board)
+        x_mask, _ = BitBoard.from_board(canonical)
+        canonical_position = x_mask.bit_length() - 1
+
+        self.assertEqual(invert_transform(canonical_position, transform), 2)
+
+    def test_reachable_positions_reduce(self):
+        """Test the 5,478 reachable positions collapse to 765 classes"""
+        seen = set()
+
+        def walk(x_mask, o_mask, x_to_move):
+            if (x_mask, o_mask) in seen:
+                return
+            seen.add((x_mask, o_mask))
+            if WINNING_MASKS[x_mask] or WINNING_MASKS[o_mask]:
+                return
+            for position in range(9):
+                if not (x_mask | o_mask) >> position & 1:
+                    if x_to_move:
+                        walk(x_mask | 1 << position, o_mask, False)
+                    else:
+                        walk(x_mask, o_mask | 1 << position, True)
+
+        walk(0, 0, True)
+
+        self.assertEqual(len(seen), 5478)
+        self.assertEqual(len({canonicalize(x, o)[:2] for x, o in seen}), 765)
+
+    def test_canonical_opening(self):
+        """Test symmetric openings and their prefixes share a key"""
+        self.assertEqual(canonical_opening([8, 4, 0]), '048')
+        self.assertEqual(canonical_opening([2, 4, 6, 1]), '048')
+        self.assertEqual(canonical_opening([5, 1]), canonical_opening([3, 1]))
+
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, GAME_FLUSH_INTERVAL=60)
+class GameConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='wsplayer1', password='testpass123')
+        self.user2 = User.objects.create_user(username='wsplayer2', password='testpass123')
+        self.game = Game.objects.create(player1=self.user1, player2=self.user2,
+                                        current_turn=self.user1, status='in_progress')
+        self.game.initialize_board()
+        self.game.save()
+
+    def tearDown(self):
+        # Persist what the test left queued while its rows still exist, and start the next one cold
+        store.flush()
+        store.games.clear()
+
+    async def connect(self, user, query=''):
+        communicator = WebsocketCommunicator(
+            JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+            f'/ws/game/{self.game.id}/?token={AccessToken.for_user(user)}{query}'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        if not query:
+            await communicator.receive_json_from()  # initial game_state
+        return communicator
+
+    async def test_moves_are_written_behind(self):
+        """Test moves are served from memory and persisted in a batch at game end"""
+        player1 = await self.connect(self.user1)
+        player2 = await self.connect(self.user2)
+        moves = [(player1, 0), (player2, 3), (player1, 1), (player2, 4)]
+
+        for seq, (communicator, position) in enumerate(moves, start=1):
+            await communicator.send_json_to({'action': 'make_move', 'position': position})
+            message = await player1.receive_json_from()
+            await player2.receive_json_from()
+            self.assertEqual(message['type'], 'move_applied')
+            self.assertEqual(message['seq'], seq)
+            self.assertEqual(message['position'], position)
+
+        # Nothing flushed yet: the live state is authoritative
+        self.assertEqual(await database_sync_to_async(self.game.moves.count)(), 0)
+        self.assertEqual(store.get(self.game.id).moves, [0, 3, 1, 4])
+
+        await player1.send_json_to({'action': 'make_move', 'position': 2})
+        message = await player1.receive_json_from()
+        await player2.receive_json_from()
+        self.assertEqual(message, {
+            'type': 'move_applied', 'seq': 5, 'position': 2, 'symbol': 'X', 'next_turn': None,
+            'status': 'finished', 'result': 'player1_win', 'winner': str(self.user1.id),
+        })
+
+        # Finishing move forces a synchronous flush
+        game = await database_sync_to_async(Game.objects.get)(id=self.game.id)
+        self.assertEqual(game.status, 'finished')
+        self.assertEqual(game.result, 'player1_win')
+        self.assertEqual(game.board_state[0], ['X', 'X', 'X'])
+        self.assertEqual((game.move_count, game.move_log), (5, '000003001004002'))
+        self.assertEqual(await database_sync_to_async(game.moves.count)(), 5)
+        self.assertIsNone(store.get(self.game.id))
+
+        await player1.disconnect()
+        await player2.disconnect()
+
+    @override_settings(GAME_AUDIT_MOVES=False)
+    async def test_move_log_without_audit_rows(self):
+        """Test the game row alone records moves when Move rows are off, and reloads from it"""
+        player1 = await self.connect(self.user1)
+        await player1.send_json_to({'action': 'make_move', 'position': 4})
+        await player1.receive_json_from()
+        await store.aflush()
+        store.games.pop(self.game.id)
+
+        live = await store.aload(self.game.id)
+        self.assertEqual(live.moves, [4])
+        self.assertEqual(live.current_turn.id, self.user2.id)
+        self.assertEqual(await database_sync_to_async(self.game.moves.count)(), 0)
+        await player1.disconnect()
+
+    async def test_sync_resends_full_state(self):
+        """Test a client can request the full state after a seq gap"""
+        player1 = await self.connect(self.user1)
+        await player1.send_json_to({'action': 'make_move', 'position': 4})
+        await player1.receive_json_from()
+        await player1.send_json_to({'action': 'sync'})
+        message = await player1.receive_json_from()
+
+        self.assertEqual(message['type'], 'game_state')
+        self.assertEqual(message['game']['seq'], 1)
+        self.assertEqual(message['game']['board_state'][1][1], 'X')
+        self.assertEqual(message['game']['current_turn']['username'], 'wsplayer2')
+        await player1.disconnect()
+
+    @override_settings(GAME_EVENT_LOG_SIZE=2)
+    async def test_resume_replays_missed_events(self):
+        """Test reconnecting replays only missed events, or a snapshot once the log rotated"""
+        player1 = await self.connect(self.user1)
+        player2 = await self.connect(self.user2)
+        for communicator, position in [(player1, 0), (player2, 4), (player1, 8)]:
+            await communicator.send_json_to({'action': 'make_move', 'position': position})
+            await player1.receive_json_from()
+            await player2.receive_json_from()
+        await player2.disconnect()
+
+        resumed = await self.connect(self.user2, query='&seq=1')
+        self.assertEqual([(await resumed.receive_json_from())['seq'] for _ in range(2)], [2, 3])
+        self.assertTrue(await resumed.receive_nothing())
+
+        await resumed.send_json_to({'action': 'resume', 'seq': 0})
+        message = await resumed.receive_json_from()
+        self.assertEqual(message['type'], 'game_state')
+        self.assertEqual(message['game']['seq'], 3)
+
+        await player1.disconnect()
+        await resumed.disconnect()
+
+    @override_settings(GAME_FLUSH_INTERVAL=0.05)
+    async def test_failed_final_flush_is_announced_and_retried(self):
+        """Test a finishing move whose flush fails is still broadcast, then persisted by a retry"""
+        attempts = []
+
+        def flaky_finalize(*args, **kwargs):
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise DatabaseError('connection lost')
+            return finalize_game(*args, **kwargs)
+
+        player1 = await self.connect(self.user1)
+        player2 = await self.connect(self.user2)
+        with mock.patch('game.state_store.finalize_game', side_effect=flaky_finalize):
+            for communicator, position in [(player1, 0), (player2, 3), (player1, 1), (player2, 4), (player1, 2)]:
+                await communicator.send_json_to({'action': 'make_move', 'position': position})
+                message = await player1.receive_json_from()
+                await player2.receive_json_from()
+            self.assertEqual((message['status'], message['result']), ('finished', 'player1_win'))
+
+            for _ in range(40):
+                await asyncio.sleep(0.05)
+                game = await database_sync_to_async(Game.objects.get)(id=self.game.id)
+                if game.status == 'finished':
+                    break
+
+        self.assertEqual((game.status, game.result, game.move_count), ('finished', 'player1_win', 5))
+        self.assertEqual(len(attempts), 2)
+        self.assertIsNone(store.get(self.game.id))
+        await player1.disconnect()
+        await player2.disconnect()
+
+    async def test_bot_to_move_plays_on_load(self):
+        """Test a game stored with the bot to move (e.g. across a restart) gets the bot's reply on load"""
+        bot = await database_sync_to_async(get_bot_user)()
+        self.game.player2 = self.game.current_turn = bot
+        self.game.board_state[1][1] = 'X'
+        self.game.move_log, self.game.move_count, self.game.version = encode_moves([4]), 1, 1
+        await database_sync_to_async(self.game.save)()
+
+        player1 = await self.connect(self.user1, query='&seq=0')
+        message = await player1.receive_json_from()
+        self.assertEqual((message['type'], message['game']['current_turn']['username']), ('game_state', bot.username))
+        message = await player1.receive_json_from()
+        self.assertEqual((message['type'], message['seq']), ('move_applied', 2))
+        self.assertEqual(store.get(self.game.id).current_turn.id, self.user1.id)
+        await player1.disconnect()
+
+    async def test_rejects_out_of_turn_move(self):
+        """Test a move by the player not on turn is rejected"""
+        player2 = await self.connect(self.user2)
+        await player2.send_json_to({'action': 'make_move', 'position': 0})
+        message = await player2.receive_json_from()
+
+        self.assertEqual(message, {'type': 'error', 'message': 'Not your turn'})
+        await player2.disconnect()
+
+    async def test_concurrent_moves_are_applied_in_order(self):
+        """Test moves sent at once by both players are applied one at a time without gaps"""
+        player1 = await self.connect(self.user1)
+        player2 = await self.connect(self.user2)
+        for communicator, position in [(player1, 0), (player2, 3), (player1, 1), (player2, 4), (player1, 6)]:
+            await communicator.send_json_to({'action': 'make_move', 'position': position})
+
+        applied = []
+        while not await player1.receive_nothing(timeout=0.5):
+            message = await player1.receive_json_from()
+            if message['type'] == 'move_applied':
+                applied.append(message)
+        self.assertEqual([message['seq'] for message in applied], list(range(1, len(applied) + 1)))
+        self.assertEqual([message['symbol'] for message in applied], ['X', 'O'] * (len(applied) // 2)
+                         + ['X'] * (len(applied) % 2))
+        self.assertEqual(store.get(self.game.id).moves, [message['position'] for message in applied])
+
+        await player1.disconnect()
+        await player2.disconnect()
+
+    @override_settings(GAME_WORKERS=['w0', 'w1'])
+    async def test_moves_are_forwarded_to_the_owner(self):
+        """Test a socket on another worker forwards moves to the game's owner"""
+        owner = owner_of(self.game.id)
+        other = 'w1' if owner == 'w0' else 'w0'
+        with override_settings(GAME_WORKER_ID=other):
+            # The snapshot and the move both wait on the owner's channel
+            player1 = await self.connect(self.user1, query='&seq=')
+            await player1.send_json_to({'action': 'make_move', 'position': 4})
+            self.assertTrue(await player1.receive_nothing())
+            self.assertIsNone(store.get(self.game.id))
+
+        with override_settings(GAME_WORKER_ID=owner):
+            listener = asyncio.ensure_future(actors.listen())
+            snapshot = await player1.receive_json_from()
+            message = await player1.receive_json_from()
+        listener.cancel()
+        actors._listener.cancel()
+
+        self.assertEqual((snapshot['type'], snapshot['game']['seq']), ('game_state', 0))
+        self.assertEqual((message['seq'], message['position']), (1, 4))
+        self.assertEqual(store.get(self.game.id).moves, [4])
+        await player1.disconnect()
+
+    @override_settings(GAME_WORKERS=['w0', 'w1'])
+    async def test_resume_is_answered_by_the_owner(self):
+        """Test a socket resuming on another worker gets the missed events from the owner's log"""
+        owner = owner_of(self.game.id)
+        other = 'w1' if owner == 'w0' else 'w0'
+        with override_settings(GAME_WORKER_ID=owner):
+            player1 = await self.connect(self.user1)
+            player2 = await self.connect(self.user2)
+            for communicator, position in [(player1, 0), (player2, 4), (player1, 8)]:
+                await communicator.send_json_to({'action': 'make_move', 'position': position})
+                await player1.receive_json_from()
+                await player2.receive_json_from()
+            await player2.disconnect()
+            actors._listener.cancel()
+
+        with override_settings(GAME_WORKER_ID=other):
+            resumed = await self.connect(self.user2, query='&seq=1')
+            self.assertTrue(await resumed.receive_nothing())
+
+        with override_settings(GAME_WORKER_ID=owner):
+            listener = asyncio.ensure_future(actors.listen())
+            seqs = [(await resumed.receive_json_from())['seq'] for _ in range(2)]
+        listener.cancel()
+        actors._listener.cancel()
+
+        self.assertEqual(seqs, [2, 3])
+        self.assertTrue(await resumed.receive_nothing())
+        await player1.disconnect()
+        await resumed.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MATCHMAKING_BACKEND='database')
+class LobbyConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'lobby{i}', password='testpass123') for i in range(3)
+        ]
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(
+            JWTAuthMiddleware(URLRouter(websocket_urlpatterns)), f'/ws/lobby/?token={AccessToken.for_user(user)}'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_enqueue_pushes_matched_to_both_players(self):
+        """Test a queued player is pushed the game id when an opponent joins"""
+        player1 = await self.connect(self.users[0])
+        player2 = await self.connect(self.users[1])
+
+        await player1.send_json_to({'action': 'enqueue'})
+        queued = await player1.receive_json_from()
+        self.assertEqual(queued['type'], 'queued')
+
+        await player2.send_json_to({'action': 'enqueue'})
+        expected = {'type': 'matched', 'game_id': queued['game_id']}
+        self.assertEqual(await player1.receive_json_from(), expected)
+        self.assertEqual(await player2.receive_json_from(), expected)
+
+        await player1.disconnect()
+        await player2.disconnect()
+
+    async def test_browse_streams_open_game_diffs(self):
+        """Test browsing sends the open games once, then only diffs"""
+        browser = await self.connect(self.users[0])
+        await browser.send_json_to({'action': 'browse'})
+        self.assertEqual(await browser.receive_json_from(), {'type': 'open_games', 'games': []})
+
+        player1 = await self.connect(self.users[1])
+        await player1.send_json_to({'action': 'enqueue', 'board_size': 4, 'win_length': 3})
+        game_id = (await player1.receive_json_from())['game_id']
+        added = await browser.receive_json_from()
+        self.assertEqual(added['type'], 'open_games_diff')
+        self.assertEqual([game['id'] for game in added['added']], [game_id])
+        self.assertEqual(added['added'][0]['board_size'], 4)
+
+        player2 = await self.connect(self.users[2])
+        await player2.send_json_to({'action': 'enqueue', 'board_size': 4, 'win_length': 3})
+        self.assertEqual(await browser.receive_json_from(),
+                         {'type': 'open_games_diff', 'added': [], 'removed': [game_id]})
+
+        for communicator in (browser, player1, player2):
+            await communicator.disconnect()
+
+
+@override_settings(RATING_ENGINE='fixed')
+class FinalizationTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='final1', password='testpass123')
+        self.user2 = User.objects.create_user(username='final2', password='testpass123', rating=10)
+        self.game = Game.objects.create(player1=self.user1, player2=self.user2,
+                                        current_turn=self.user1, status='in_progress')
+
+    def finalize(self, result, **fields):
+        return finalize_game(self.game.id, self.user1.id, self.user2.id, result, **fields)
+
+    def test_win_settles_both_players_once(self):
+        """Test a win updates the game and both players, and a repeat is ignored"""
+        self.assertTrue(self.finalize('player1_win', version=7))
+        self.assertFalse(self.finalize('player1_win'))
+
+        self.game.refresh_from_db()
+        self.user1.refresh_from_db()
+        self.user2.refresh_from_db()
+        self.assertEqual((self.game.status, self.game.winner, self.game.version), ('finished', self.user1, 7))
+        self.assertIsNotNone(self.game.finished_at)
+        self.assertEqual((self.user1.wins, self.user1.rating), (1, 1025))
+        self.assertEqual((self.user2.losses, self.user2.rating), (1, 0))
+
+    def test_draw(self):
+        """Test a draw counts for both players"""
+        self.finalize('draw')
+
+        self.game.refresh_from_db()
+        self.assertIsNone(self.game.winner)
+        self.assertEqual(
+            list(User.objects.filter(id__in=[self.user1.id, self.user2.id])
+                 .order_by('username').values_list('draws', 'rating')),
+            [(1, 1005), (1, 15)]
+        )
+
+
+class GameStateStoreTestCase(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'live{i}', password='testpass123') for i in range(4)]
+        self.store = GameStateStore()
+        self.games = []
+        for player1, player2 in (self.users[:2], self.users[2:]):
+            game = Game(player1=player1, player2=player2, current_turn=player1, status='in_progress')
+            game.initialize_board()
+            game.save()
+            self.games.append(self.store.load(game.id))
+
+    def play(self, live, *positions):
+        for position in positions:
+            self.store.apply_move(live, live.current_turn.id, position)
+
+    def test_deleted_game_is_dropped_without_blocking_the_batch(self):
+        """Test a live game whose row was deleted is dropped and the other games still persist"""
+        gone, kept = self.games
+        self.play(gone, 0, 4)
+        self.play(kept, 2, 6, 8)
+        Game.objects.filter(id=gone.id).delete()
+
+        self.store.flush()
+
+        self.assertEqual(list(Move.objects.filter(game_id=kept.id).values_list('position', flat=True)), [2, 6, 8])
+        self.assertEqual(Game.objects.get(id=kept.id).move_count, 3)
+        self.assertIsNone(self.store.get(gone.id))
+        self.assertEqual((self.store._pending_moves, self.store._dirty), ([], {}))
+
+    @override_settings(GAME_FLUSH_MAX_ATTEMPTS=2)
+    def test_failing_game_is_retried_then_dropped(self):
+        """Test a game that fails to flush is queued again alone, up to GAME_FLUSH_MAX_ATTEMPTS"""
+        failing, kept = self.games
+        self.play(failing, 0, 3, 1, 4, 2)  # X wins: flushed through finalize_game
+        self.play(kept, 4)
+
+        with mock.patch('game.state_store.finalize_game', side_effect=DatabaseError('deadlock')):
+            with self.assertRaises(FlushError):
+                self.store.flush()
+            self.assertEqual(Move.objects.filter(game_id=kept.id).count(), 1)
+            self.assertEqual(Move.objects.filter(game_id=failing.id).count(), 0)
+            self.assertEqual([m.position for m in self.store._pending_moves], [0, 3, 1, 4, 2])
+
+            self.play(kept, 0)
+            self.store.flush()
+
+        self.assertEqual(Move.objects.filter(game_id=kept.id).count(), 2)
+        self.assertIsNone(self.store.get(failing.id))
+        self.assertEqual(Game.objects.get(id=failing.id).status, 'in_progress')
+        self.assertEqual(self.store._pending_moves, [])
+
+
+@override_settings(ELO_K_FACTOR=32, GLICKO2_TAU=0.5)
+class RatingEngineTestCase(SimpleTestCase):
+    def ratings(self, *players):
+        return Ratings(*(np.array(values, dtype=float) for values in zip(*players)))
+
+    def test_elo(self):
+        """Test Elo moves equal players by K/2 and is zero-sum"""
+        new1, new2 = get_rating_engine('elo').rate(
+            self.ratings((1000, 350, 0.06), (1200, 350, 0.06)),
+            self.ratings((1000, 350, 0.06), (1000, 350, 0.06)),
+            [1, 0.5]
+        )
+
+        self.assertEqual(new1.rating.tolist(), [1016, 1192])
+        self.assertEqual(new2.rating.tolist(), [984, 1008])
+
+    def test_glicko2_single_game(self):
+        """Test a Glicko-2 win against a stronger, settled opponent"""
+        new1, new2 = get_rating_engine('glicko2').rate(
+            self.ratings((1500, 200, 0.06)), self.ratings((1550, 100, 0.06)), [1]
+        )
+
+        self.assertEqual(new1.rating[0], 1596)
+        self.assertAlmostEqual(new1.deviation[0], 175.903, places=3)
+        self.assertAlmostEqual(new1.volatility[0], 0.06, places=4)
+        self.assertLess(new2.rating[0], 1550)
+
+    def test_vectorized_matches_single_games(self):
+        """Test rating a wave of games at once equals rating them one by one"""
+        engine = get_rating_engine('glicko2')
+        player1 = [(1000, 350, 0.06), (1400, 60, 0.05), (900, 120, 0.07)]
+        player2 = [(1100, 80, 0.06), (1000, 350, 0.06), (1900, 40, 0.06)]
+        scores = [1, 0.5, 0]
+        batch = engine.rate(self.ratings(*player1), self.ratings(*player2), scores)
+
+        for i, game in enumerate(zip(player1, player2, scores)):
+            single = engine.rate(self.ratings(game[0]), self.ratings(game[1]), [game[2]])
+            for side in range(2):
+                for field in range(3):
+                    self.assertAlmostEqual(single[side][field][0], batch[side][field][i])
+
+    def test_rating_waves_keep_player_order(self):
+        """Test games are grouped so no player appears twice in a wave"""
+        waves = rating_waves(np.array([0, 2, 0, 3]), np.array([1, 3, 2, 4]))
+
+        self.assertEqual([wave.tolist() for wave in waves], [[0, 1], [2, 3]])
+
+
+@override_settings(RATING_ENGINE='glicko2')
+class RecomputeRatingsTestCase(TestCase):
+    def test_recompute_reproduces_live_ratings(self):
+        """Test replaying finished games rebuilds the ratings applied at game end"""
+        users = [User.objects.create_user(username=f'rated{i}', password='testpass123') for i in range(3)]
+        results = [(0, 1, 'player1_win'), (1, 2, 'draw'), (2, 0, 'player1_win'), (0, 1, 'player2_win')]
+        for i, (first, second, result) in enumerate(results):
+            game = Game.objects.create(player1=users[first], player2=users[second], status='in_progress')
+            finalize_game(game.id, users[first].id, users[second].id, result,
+                          finished_at=timezone.now() + timedelta(seconds=i))
+        fields = ['rating', 'rating_deviation', 'rating_volatility', 'wins', 'losses', 'draws']
+        live = list(User.objects.order_by('username').values_list(*fields))
+
+        User.objects.update(rating=1000, rating_deviation=350, rating_volatility=0.06,
+                            wins=0, losses=0, draws=0)
+        call_command('recompute_ratings', stdout=StringIO())
+
+        self.assertEqual(list(User.objects.order_by('username').values_list(*fields)), live)
+        self.assertEqual(live[0][3:], (1, 2, 0))
+
+
+class LoadTestCommandTestCase(TransactionTestCase):
+    def test_loadtest_plays_matched_games(self):
+        out = StringIO()
+        call_command('loadtest', '--players', '6', '--concurrency', '2', '--json', stdout=out)
+        result = json.loads(out.getvalue())
+
+        self.assertEqual((result['players'], result['games']), (6, 3))
+        self.assertGreaterEqual(result['moves'], 3 * 5)
+        self.assertIsNotNone(result['round_trip_ms']['p99'])
+        self.assertGreater(result['queries_per_move'], 0)
+        self.assertFalse(get_user_model().objects.filter(username__startswith='loadtest-').exists())
+        self.assertFalse(Game.objects.exists())
+
+
+class BenchmarkTestCase(TransactionTestCase):
+    def setUp(self):
+        benchmarks._fixtures.clear()
+
+    def test_benchmarks_run(self):
+        for bench in benchmarks.BENCHMARKS.values():
+            result = benchmarks.run_benchmark(bench._replace(number=2), rounds=1)
+            self.assertGreater(result['median_us'], 0, bench.name)
+        self.assertEqual(Game.objects.filter(status='in_progress').count(), 0)
+
+    def test_compare_flags_regressions(self):
+        def run(**medians):
+            return {'benchmarks': {name: {'median_us': median} for name, median in medians.items()}}
+
+        rows = benchmarks.compare(run(a=10.0, b=10.0, gone=1.0), run(a=11.5, b=10.5, new=1.0), max_regression=10)
+        self.assertEqual(rows, [('a', 10.0, 11.5, 15.0, True), ('b', 10.0, 10.5, 5.0, False)])
+
+
+class HashRingTestCase(SimpleTestCase):
+    def test_owner_is_stable_and_balanced(self):
+        """Test every key has one owner, load is spread, and a new worker takes only its share"""
+        keys = [f'game-{i}' for i in range(3000)]
+        ring = HashRing(['w0', 'w1', 'w2'])
+        owners = [ring.owner(key) for key in keys]
+
+        self.assertEqual(owners, [HashRing(['w2', 'w0', 'w1']).owner(key) for key in keys])
+        for worker in ('w0', 'w1', 'w2'):
+            self.assertGreater(owners.count(worker), 600)
+
+        grown = [HashRing(['w0', 'w1', 'w2', 'w3']).owner(key) for key in keys]
+        moved = [(before, after) for before, after in zip(owners, grown) if before != after]
+        self.assertTrue(all(after == 'w3' for _, after in moved))
+        self.assertLess(len(moved), 1200)
+        self.assertIsNone(HashRing([]).owner('game'))
+
+
+class BroadcastTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='broadcast1', password='testpass123')
+        self.user2 = User.objects.create_user(username='broadcast2', password='testpass123')
+        self.game = Game.objects.create(player1=self.user1, player2=self.user2,
+                                        current_turn=self.user1, status='in_progress')
+        self.game.initialize_board()
+        self.game.save()
+
+    def test_state_is_encoded_once_per_version(self):
+        """Test the encoded state is cached by game version"""
+        message = game_state_message(self.game)
+
+        self.assertIs(game_state_message(self.game), message)
+        self.assertEqual(json.loads(message), {'type': 'game_state', 'game': game_state(self.game)})
+
+        self.game.board_state[0][0] = 'X'
+        self.game.version += 1
+        updated = json.loads(game_state_message(self.game))
+
+        self.assertEqual(updated['game']['board_state'][0][0], 'X')
+
+
+@override_settings(GAME_EVENT_LOG_SIZE=3)
+class EventLogTestCase(SimpleTestCase):
+    def test_since(self):
+        """Test missed events are returned only while the log still covers them"""
+        log = EventLog()
+        for seq in range(1, 6):
+            log.record('game', seq, f'event-{seq}')
+
+        self.assertEqual(log.since('game', 3, 5), ['event-4', 'event-5'])
+        self.assertEqual(log.since('game', 5, 5), [])
+        self.assertIsNone(log.since('game', 1, 5))  # seq 2 rotated out
+        self.assertIsNone(log.since('game', 3, 6))  # seq 6 never recorded here
+        self.assertIsNone(log.since('other', 0, 1))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class MatchmakingTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'queued{i}', password='testpass123')
+            for i in range(4)
+        ]
+        self.matchmaker = DatabaseMatchmaker()
+
+    def test_pairs_oldest_waiting_game_once(self):
+        """Test each waiting game is claimed by exactly one joiner, oldest first"""
+        first, created = self.matchmaker.join(self.users[0])
+        second, _ = self.matchmaker.join(self.users[1], board_size=3, win_length=3)
+
+        self.assertEqual(created, CREATED)
+        self.assertEqual(second.id, first.id)
+
+        game, outcome = self.matchmaker.join(self.users[2])
+        self.assertEqual(outcome, CREATED)
+        game, outcome = self.matchmaker.join(self.users[3])
+        self.assertEqual(outcome, MATCHED)
+
+        first.refresh_from_db()
+        self.assertEqual(first.player2, self.users[1])
+        self.assertEqual(first.current_turn, self.users[0])
+        self.assertEqual(first.status, 'in_progress')
+        self.assertEqual(first.version, 1)
+
+    def test_active_game_and_board_settings(self):
+        """Test players are not queued twice and only meet on the same board settings"""
+        game, _ = self.matchmaker.join(self.users[0], board_size=15, win_length=5)
+
+        self.assertEqual(self.matchmaker.join(self.users[0]), (game, ACTIVE))
+        other, outcome = self.matchmaker.join(self.users[1])
+        self.assertEqual(outcome, CREATED)
+        self.assertNotEqual(other.id, game.id)
+        self.assertEqual(self.matchmaker.join(self.users[2], board_size=15, win_length=5), (game, MATCHED))
+
+    def test_claim_locks_only_the_game_row(self):
+        """Test the claim locks one waiting game row and skips locked ones, never the creator's user row"""
+        from django.db.backends.postgresql.base import DatabaseWrapper
+
+        # Compiled for Postgres without connecting; SQLite has no FOR UPDATE to inspect
+        postgres = DatabaseWrapper({**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'})
+        postgres.connection, postgres.autocommit = object(), False
+        queryset = self.matchmaker.claimable_games(self.users[0], 3, 3)[:1]
+        sql, _ = queryset.query.get_compiler(connection=postgres).as_sql()
+
+        self.assertTrue(sql.endswith('LIMIT 1 FOR UPDATE OF "game_game" SKIP LOCKED'), sql)
+
+
+@skipUnless(redis_available(), 'Redis is not reachable at REDIS_URL')
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class RedisMatchmakerTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'queued{i}', password='testpass123')
+            for i in range(2)
+        ]
+        self.matchmaker = RedisMatchmaker()
+        self.matchmaker.queue_key = lambda board_size, win_length: f'test:matchmaking:{board_size}:{win_length}'
+        self.key = self.matchmaker.queue_key(3, 3)
+
+    def tearDown(self):
+        get_redis().delete(self.key)
+
+    def test_rolled_back_seat_requeues_the_game(self):
+        """Test a game popped by a join that rolls back goes back to the head of the queue"""
+        with self.captureOnCommitCallbacks(execute=True):
+            game, _ = self.matchmaker.join(self.users[0])
+
+        with mock.patch.object(metrics, 'record_match', side_effect=RuntimeError('metrics down')):
+            with self.assertRaises(RuntimeError):
+                self.matchmaker.join(self.users[1])
+
+        game.refresh_from_db()
+        self.assertEqual(game.status, 'waiting')
+        self.assertEqual(get_redis().lrange(self.key, 0, -1), [f'{game.id}:{self.users[0].id}'.encode()])
+        self.assertEqual(self.matchmaker.join(self.users[1]), (game, MATCHED))
+
+
+class QueryPlanTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='planner', password='testpass123')
+        if connection.vendor == 'postgresql':
+            # A near-empty test table is cheaper to scan; make the planner show its index choice
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndexes(self, queryset, *names):
+        plan = queryset.explain()
+        for name in names:
+            self.assertIn(name, plan)
+
+    def test_active_game_lookup_uses_indexes(self):
+        """Test the per-request active game lookup is an index search on both seats"""
+        self.assertUsesIndexes(active_games(self.user), 'game_player1_status_idx', 'game_player2_status_idx')
+
+    def test_game_history_page_uses_index(self):
+        """Test a page of a player's history is a range scan of the per-seat index"""
+        older = Game.objects.filter(player1=self.user, created_at__lt=timezone.now())
+        self.assertUsesIndexes(older.order_by('-created_at', '-pk')[:20], 'game_player1_created_idx')
+
+    def test_waiting_game_scan_uses_partial_index(self):
+        """Test matchmaking reads waiting games from the partial index"""
+        self.assertUsesIndexes(waiting_games(3, 3).exclude(player1=self.user), 'game_waiting_idx')
+
+
+@override_settings(MATCHMAKING_BUCKET_SIZE=100, MATCHMAKING_INITIAL_GAP=50,
+                   MATCHMAKING_GAP_GROWTH=10, MATCHMAKING_MAX_GAP=400)
+class RatingPairingTestCase(SimpleTestCase):
+    def test_pairs_closest_ratings_within_window(self):
+        """Test the longest waiter takes the closest rating within its gap"""
+        tickets = [
+            Ticket('a', 1, 1000, 1), Ticket('b', 2, 1040, 0),
+            Ticket('c', 3, 1030, 0), Ticket('d', 4, 1300, 0),
+        ]
+        pairs = [(t.game_id, o.game_id, gap) for t, o, gap in pair_tickets(tickets)]
+
+        self.assertEqual(pairs, [('a', 'c', 30)])
+
+    def test_window_widens_with_wait(self):
+        """Test a long wait widens the accepted gap up to the maximum"""
+        far = [Ticket('a', 1, 1000, 0), Ticket('b', 2, 1300, 0)]
+        self.assertEqual(pair_tickets(far), [])
+
+        far = [ticket._replace(waited=30) for ticket in far]
+        self.assertEqual([(t.game_id, o.game_id, gap) for t, o, gap in pair_tickets(far)], [('a', 'b', 300)])
+
+        too_far = [Ticket('a', 1, 1000, 3600), Ticket('b', 2, 1500, 0)]
+        self.assertEqual(pair_tickets(too_far), [])
+
+    def test_gap_must_suit_both_players(self):
+        """Test a long wait never pushes a newcomer past their own acceptable gap"""
+        tickets = [Ticket('a', 1, 1000, 30), Ticket('b', 2, 1300, 0)]
+        self.assertEqual(pair_tickets(tickets), [])
+
+        tickets.append(Ticket('c', 3, 1040, 0))
+        self.assertEqual([(t.game_id, o.game_id, gap) for t, o, gap in pair_tickets(tickets)], [('a', 'c', 40)])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, MATCHMAKING_INITIAL_GAP=50)
+class RatingMatchmakerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.matchmaker = RatingMatchmaker()
+        self.low = User.objects.create_user(username='low', password='testpass123', rating=1000)
+        self.mid = User.objects.create_user(username='mid', password='testpass123', rating=1020)
+        self.high = User.objects.create_user(username='high', password='testpass123', rating=1600)
+
+    def test_batch_pass_pairs_by_rating(self):
+        """Test join only queues and the batch pass pairs close ratings into one game"""
+        games = {user: self.matchmaker.join(user) for user in (self.low, self.high, self.mid)}
+        self.assertTrue(all(outcome == CREATED for _, outcome in games.values()))
+
+        summary = run_matchmaking_pass()
+
+        self.assertEqual((summary['waiting'], summary['matched']), (3, 1))
+        game = Game.objects.get(id=games[self.low][0].id)
+        self.assertEqual((game.player2, game.status), (self.mid, 'in_progress'))
+        self.assertFalse(Game.objects.filter(id=games[self.mid][0].id).exists())
+        self.assertEqual(self.matchmaker.join(self.mid), (game, ACTIVE))
+        self.assertEqual(Game.objects.get(id=games[self.high][0].id).status, 'waiting')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['matched_players'], 2)
+        self.assertEqual(snapshot['avg_rating_gap'], 20)
+        self.assertEqual(snapshot['rating_gap']['le_25'], 2)
+        self.assertEqual(snapshot['last_pass']['matched'], 1)
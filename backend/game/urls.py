@@ -1,11 +1,16 @@
 from django.urls import path
-from .views import CreateGameView, JoinMatchmakingView, GameDetailView, MyGamesView
+from .views import (
+    CreateGameView, JoinMatchmakingView, GameDetailView, MyGamesView, OpeningStatsView,
+    MatchmakingMetricsView
+)
 
 app_name = "game"
 
 urlpatterns = [
     path("create/", CreateGameView.as_view(), name="create-game"),
     path("matchmaking/", JoinMatchmakingView.as_view(), name="join-matchmaking"),
+    path("matchmaking/metrics/", MatchmakingMetricsView.as_view(), name="matchmaking-metrics"),
     path("<uuid:game_id>/", GameDetailView.as_view(), name="game-detail"),
     path("my/", MyGamesView.as_view(), name="my-games"),
+    path("openings/", OpeningStatsView.as_view(), name="opening-stats"),
 ]
@@ -0,0 +1,46 @@
+"""Committed game versions, the cached validators of the polled game endpoints."""
+from django.core.cache import cache
+from utils.conditional import TOKEN_TIMEOUT, new_token, rotate_tokens, weak_etag
+
+
+def version_key(game_id):
+    return f'game:version:{game_id}'
+
+
+def user_games_key(user_id):
+    return f'game:user_games:{user_id}'
+
+
+def record_game_changes(changes):
+    """Record committed (game_id, version, player_ids) changes in one cache write"""
+    token = new_token()
+    values = {}
+    for game_id, version, player_ids in changes:
+        values[version_key(game_id)] = version
+        values.update((user_games_key(player_id), token) for player_id in player_ids if player_id)
+    if values:
+        cache.set_many(values, TOKEN_TIMEOUT)
+
+
+def game_changed(game):
+    record_game_changes([(game.id, game.version, (game.player1_id, game.player2_id))])
+
+
+def game_deleted(game_id, *player_ids):
+    cache.delete(version_key(game_id))
+    rotate_tokens(*(user_games_key(player_id) for player_id in player_ids))
+
+
+def cached_version(game_id):
+    """Committed version of a game, or None if not cached"""
+    return cache.get(version_key(game_id))
+
+
+def remember_version(game):
+    """Cache a version read from the database, unless a writer has recorded a newer one"""
+    cache.add(version_key(game.id), game.version, TOKEN_TIMEOUT)
+    return game.version
+
+
+def game_etag(game_id, version):
+    return weak_etag(game_id, version)
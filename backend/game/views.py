@@ -1,47 +1,52 @@
 from rest_framework.views import APIView
-from rest_framework import status, permissions
+from rest_framework import status, permissions, serializers
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from drf_spectacular.utils import extend_schema
+from django.db.models import Count, prefetch_related_objects
+from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiParameter
 from .models import Game
-from .serializer import GameSerializer
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .serializer import (
+    GAME_PLAYERS, GameSerializer, GameSettingsSerializer, GameSummarySerializer, moves_with_players,
+    with_game_details
+)
+from .bot import should_match_with_bot, match_with_bot
+from .symmetry import OPENING_DEPTH, canonical_opening
+from .broadcast import notify_game_update
+from .versions import cached_version, game_etag, remember_version, user_games_key
+from .matchmaking import (
+    ACTIVE, MATCHED, active_game_for, create_game_for_user, get_matchmaker, metrics
+)
+from utils.conditional import add_validators, get_token, not_modified, weak_etag
+from utils.custom_pagination import KeysetPagination
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def create_game_for_user(user):
-    """Helper: Create and initialize a new game for the given user"""
-    game = Game.objects.create(player1=user, status='waiting')
-    game.initialize_board()
-    game.save()
-    return game
-
-
 class CreateGameView(APIView):
     """Create a new game and wait for opponent"""
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(
         summary="Create a new game",
-        description="Create a new Tic Tac Toe game. If user already has an active game, returns that game instead.",
+        description="Create a new Tic Tac Toe game. If user already has an active game, returns that game instead. "
+                    "Optionally pass board_size and win_length for larger k-in-a-row boards.",
+        request=GameSettingsSerializer,
         responses={
             200: GameSerializer,
             201: GameSerializer,
+            400: {"description": "Invalid board settings"},
             401: {"description": "Unauthorized"}
         },
         tags=['Games']
     )
     def post(self, request):
+        settings_serializer = GameSettingsSerializer(data=request.data)
+        settings_serializer.is_valid(raise_exception=True)
         try:
             # Check if user already has an active or waiting game
-            active_game = Game.objects.filter(
-                Q(player1=request.user) | Q(player2=request.user),
-                status__in=['waiting', 'in_progress']
-            ).first()
+            active_game = active_game_for(request.user)
 
             if active_game:
                 logger.info(f"[CreateGame] {request.user.username} already in game {active_game.id}")
@@ -49,7 +54,8 @@ class CreateGameView(APIView):
                 return Response(serializer.data)
 
             # Otherwise create a new game
-            game = create_game_for_user(request.user)
+            game = create_game_for_user(request.user, **settings_serializer.validated_data)
+            get_matchmaker().enqueue(game)
             logger.info(f"[CreateGame] New game created for {request.user.username}: {game.id}")
             serializer = GameSerializer(game)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -67,60 +73,41 @@ class JoinMatchmakingView(APIView):
 
     @extend_schema(
         summary="Join matchmaking",
-        description="Join matchmaking to find an opponent. Will join existing waiting game or create new one.",
+        description="Join matchmaking to find an opponent. Will join existing waiting game with the same "
+                    "board settings or create new one. A 3x3 game left waiting longer than "
+                    "BOT_MATCHMAKING_TIMEOUT seconds is matched with the bot on the next call.",
+        request=GameSettingsSerializer,
         responses={
             200: GameSerializer,
             201: GameSerializer,
+            400: {"description": "Invalid board settings"},
             401: {"description": "Unauthorized"}
         },
         tags=['Games']
     )
     def post(self, request):
+        settings_serializer = GameSettingsSerializer(data=request.data)
+        settings_serializer.is_valid(raise_exception=True)
         try:
             user = request.user
+            game, outcome = get_matchmaker().join(user, **settings_serializer.validated_data)
 
-            # Check if user already in a game
-            active_game = Game.objects.filter(
-                Q(player1=user) | Q(player2=user),
-                status__in=['waiting', 'in_progress']
-            ).first()
-
-            if active_game:
-                logger.info(f"[JoinMatchmaking] {user.username} already in active game {active_game.id}")
-                return Response(GameSerializer(active_game).data)
-
-            # Try to join an existing waiting game
-            waiting_game = Game.objects.filter(
-                status='waiting',
-                player2__isnull=True
-            ).exclude(player1=user).first()
-
-            if waiting_game:
-                waiting_game.player2 = user
-                waiting_game.current_turn = waiting_game.player1  # Player 1 (X) always starts
-                waiting_game.status = 'in_progress'
-                waiting_game.save()
-
-                logger.info(f"[JoinMatchmaking] {user.username} joined game {waiting_game.id}")
-                logger.info(f"[JoinMatchmaking] Current turn: {waiting_game.current_turn.username}")
+            if outcome == ACTIVE:
+                if should_match_with_bot(game) and match_with_bot(game):
+                    # Nobody joined in time: fell back to the bot opponent
+                    notify_game_update(game)
+                logger.info(f"[JoinMatchmaking] {user.username} already in active game {game.id}")
+                return Response(GameSerializer(game).data)
 
+            if outcome == MATCHED:
+                logger.info(f"[JoinMatchmaking] {user.username} joined game {game.id}")
                 # Notify both players in WebSocket group
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    f'game_{waiting_game.id}',
-                    {
-                        'type': 'game_update',
-                        'game': GameSerializer(waiting_game).data
-                    }
-                )
-
-                return Response(GameSerializer(waiting_game).data)
-
-            # No waiting game found → create a new one
-            logger.info(f"[JoinMatchmaking] Creating new game for {user.username}")
-            new_game = create_game_for_user(user)
-            serializer = GameSerializer(new_game)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+                notify_game_update(game)
+                return Response(GameSerializer(game).data)
+
+            # No waiting game found → a new one was created and queued
+            logger.info(f"[JoinMatchmaking] Created new game {game.id} for {user.username}")
+            return Response(GameSerializer(game).data, status=status.HTTP_201_CREATED)
         except Exception as e:
             logger.error(f"Error in matchmaking for user {request.user.username}: {e}")
             return Response(
@@ -130,12 +117,14 @@ class JoinMatchmakingView(APIView):
 
 
 class GameDetailView(APIView):
-    """Get details of a specific game"""
+    """Get details of a specific game; polls with a current ETag get 304 from the cache"""
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(
         summary="Get game details",
-        description="Retrieve details of a specific game by ID.",
+        description="Retrieve details of a specific game by ID. Responses carry an ETag that changes "
+                    "with the game's version; send it back in If-None-Match to get 304 Not Modified "
+                    "while the game is unchanged.",
         parameters=[
             {
                 'name': 'game_id',
@@ -146,16 +135,27 @@ class GameDetailView(APIView):
         ],
         responses={
             200: GameSerializer,
+            304: {"description": "Not modified"},
             401: {"description": "Unauthorized"},
             404: {"description": "Game not found"}
         },
         tags=['Games']
     )
     def get(self, request, game_id):
+        # Unchanged games are answered from the cached version without a query
+        version = cached_version(game_id)
+        if version is not None:
+            response = not_modified(request, game_etag(game_id, version))
+            if response:
+                return response
         try:
-            game = get_object_or_404(Game, id=game_id)
+            game = get_object_or_404(with_game_details(Game.objects.all()), id=game_id)
+            etag = game_etag(game.id, remember_version(game))
+            response = not_modified(request, etag)
+            if response:
+                return response
             serializer = GameSerializer(game)
-            return Response(serializer.data)
+            return add_validators(Response(serializer.data), etag)
         except Exception as e:
             logger.error(f"Error retrieving game {game_id}: {e}")
             return Response(
@@ -165,28 +165,140 @@ class GameDetailView(APIView):
 
 
 class MyGamesView(APIView):
-    """List all games of the authenticated user"""
+    """List the authenticated user's games, newest first, one cursor page at a time"""
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     @extend_schema(
         summary="Get user's games",
-        description="Retrieve all games (past and present) for the authenticated user.",
+        description="Retrieve the games (past and present) of the authenticated user, newest first. "
+                    "Results are cursor-paginated: follow `next` for older games. "
+                    "With fields=summary, boards, moves and player stats are left out; "
+                    "use the game detail endpoint for the full game. "
+                    "Pages carry an ETag that changes whenever one of the user's games does; "
+                    "send it in If-None-Match to get 304 Not Modified.",
+        parameters=[
+            OpenApiParameter(name='cursor', type=str, description='Cursor from the previous page\'s `next`'),
+            OpenApiParameter(name='page_size', type=int, description='Games per page (max 100, default 20)'),
+            OpenApiParameter(name='fields', type=str, enum=['summary'], description='Compact game summaries'),
+        ],
         responses={
-            200: GameSerializer(many=True),
-            401: {"description": "Unauthorized"}
+            200: inline_serializer(name='MyGamesPage', fields={
+                'next': serializers.URLField(allow_null=True),
+                'results': GameSerializer(many=True),
+            }),
+            304: {"description": "Not modified"},
+            401: {"description": "Unauthorized"},
+            404: {"description": "Invalid cursor"}
         },
         tags=['Games']
     )
     def get(self, request):
+        # Any change to one of the user's games rotates their token
+        etag = weak_etag(request.user.id, get_token(user_games_key(request.user.id)), request.get_full_path())
+        response = not_modified(request, etag)
+        if response:
+            return response
+        summary = request.query_params.get('fields') == 'summary'
         try:
-            games = Game.objects.filter(
-                Q(player1=request.user) | Q(player2=request.user)
+            # One branch per seat, so each pages through its own (player, created_at, id) index
+            branches = [
+                Game.objects.filter(player1=request.user),
+                Game.objects.filter(player2=request.user),
+            ]
+            related = ('player1', 'player2', 'winner') if summary else GAME_PLAYERS
+            paginator = self.pagination_class()
+            games = paginator.paginate_queryset(
+                [branch.select_related(*related) for branch in branches], request, view=self
             )
-            serializer = GameSerializer(games, many=True)
-            return Response(serializer.data)
+            if summary:
+                serializer = GameSummarySerializer(games, many=True)
+            else:
+                prefetch_related_objects(games, moves_with_players())
+                serializer = GameSerializer(games, many=True)
+            return add_validators(paginator.get_paginated_response(serializer.data), etag)
+        except NotFound:
+            raise
         except Exception as e:
             logger.error(f"Error retrieving games for user {request.user.username}: {e}")
             return Response(
                 {'error': 'Failed to retrieve games'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class OpeningStatsView(APIView):
+    """Outcome statistics for finished 3x3 games starting with an opening"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        summary="Get opening statistics",
+        description="Win/draw rates of finished 3x3 games whose first moves match the given opening. "
+                    "Rotations and reflections of the opening are counted together.",
+        parameters=[
+            OpenApiParameter(
+                name='moves',
+                type=str,
+                location=OpenApiParameter.QUERY,
+                description=f'Comma-separated positions (0-8) of the first 1-{OPENING_DEPTH} moves, e.g. "4,0"'
+            ),
+        ],
+        responses={
+            200: {"description": "Opening statistics"},
+            400: {"description": "Invalid opening"},
+            401: {"description": "Unauthorized"}
+        },
+        tags=['Games']
+    )
+    def get(self, request):
+        try:
+            positions = [int(p) for p in request.query_params.get('moves', '').split(',')]
+        except ValueError:
+            positions = []
+        if (not 1 <= len(positions) <= OPENING_DEPTH
+                or len(set(positions)) != len(positions)
+                or any(not 0 <= p <= 8 for p in positions)):
+            return Response(
+                {'error': f'moves must be 1-{OPENING_DEPTH} distinct positions between 0 and 8'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            opening = canonical_opening(positions)
+            counts = dict(
+                Game.objects.filter(status='finished', opening__startswith=opening)
+                .order_by()
+                .values_list('result')
+                .annotate(count=Count('id'))
+            )
+            games = sum(counts.values())
+            stats = {'opening': opening, 'games': games}
+            for result in ('player1_win', 'player2_win', 'draw'):
+                stats[result] = counts.get(result, 0)
+                stats[f'{result}_rate'] = round(stats[result] / games * 100, 2) if games else 0
+            return Response(stats)
+        except Exception as e:
+            logger.error(f"Error retrieving opening stats for {positions}: {e}")
+            return Response(
+                {'error': 'Failed to retrieve opening stats'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class MatchmakingMetricsView(APIView):
+    """Match latency and rating gap metrics of the matchmaker"""
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(
+        summary="Get matchmaking metrics",
+        description="Counts and histograms of match latency (seconds waited) and rating gap per matched "
+                    "player, plus the summary of the last batch pass. Staff only.",
+        responses={
+            200: {"description": "Matchmaking metrics"},
+            401: {"description": "Unauthorized"},
+            403: {"description": "Forbidden"}
+        },
+        tags=['Games']
+    )
+    def get(self, request):
+        return Response(metrics.snapshot())
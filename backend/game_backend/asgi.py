@@ -2,7 +2,6 @@ import os
 import django
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 import environ
 
 # Initialize environment variables
@@ -20,10 +19,14 @@ django.setup()
 
 # Now it’s safe to import modules that rely on Django settings
 import game.routing
+from game.actors import lifespan
+from accounts.middleware import JWTAuthMiddleware
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "lifespan": lifespan,
+    # Sockets authenticate with ?token=<JWT access token>; sessions are not used
+    "websocket": JWTAuthMiddleware(
         URLRouter(
             game.routing.websocket_urlpatterns
         )
@@ -34,6 +34,30 @@ env = environ.Env(
     JWT_REFRESH_TOKEN_LIFETIME=(int, 100), # Added explicit default casting
     ROTATE_REFRESH_TOKEN=(bool, True), # Added explicit default casting
     BLACKLIST_AFTER_ROTATION=(bool, True), # Added explicit default casting
+    WS_PRINCIPAL_CACHE_TTL=(int, 60), # Seconds a WebSocket user looked up from the users table is cached
+    BOT_USERNAME=(str, 'tictactoe-bot'),
+    BOT_MATCHMAKING_TIMEOUT=(int, 30), # Seconds before a waiting game is matched with the bot; 0 disables
+    GAME_FLUSH_INTERVAL=(float, 0.5), # Seconds between write-behind flushes of live game moves
+    GAME_FLUSH_BATCH_SIZE=(int, 100), # Queued moves that trigger an immediate flush
+    GAME_IDLE_TIMEOUT=(int, 600), # Seconds before an untouched live game is dropped from memory
+    GAME_EVENT_LOG_SIZE=(int, 64), # Recent events kept per game for socket resume
+    GAME_WORKER_ID=(str, ''), # This process's id in GAME_WORKERS; empty for a single process
+    GAME_WORKERS=(list, []), # Ids of every ASGI worker; games are owned by consistent hash of their id
+    GAME_AUDIT_MOVES=(bool, True), # Also write a Move row per move (the game row's move_log is authoritative)
+    GAME_FLUSH_MAX_ATTEMPTS=(int, 5), # Failed flushes of one live game before it is dropped (logged as critical)
+    MATCHMAKING_BACKEND=(str, 'database'), # 'database' (SELECT FOR UPDATE SKIP LOCKED), 'redis' or 'rating'
+    MATCHMAKING_BUCKET_SIZE=(int, 100), # Rating points per bucket for the 'rating' matcher
+    MATCHMAKING_INITIAL_GAP=(int, 50), # Rating gap accepted as soon as a player queues
+    MATCHMAKING_GAP_GROWTH=(float, 10.0), # Extra rating gap accepted per second waited
+    MATCHMAKING_MAX_GAP=(int, 400), # Largest rating gap ever accepted
+    MATCHMAKING_PASS_INTERVAL=(float, 1.0), # Seconds between batch passes of run_matchmaker
+    CACHE_URL=(str, 'locmemcache://'),
+    PAGINATION_COUNT_TTL=(int, 30), # Seconds a paginated listing's total is cached; 0 disables
+    PAGINATION_ESTIMATE_THRESHOLD=(int, 100000), # Postgres row estimates at least this large replace COUNT(*); 0 disables
+    LEADERBOARD_BACKEND=(str, 'database'), # 'database' or 'redis' (sorted set; see accounts/leaderboard.py)
+    RATING_ENGINE=(str, 'elo'), # 'elo', 'glicko2' or 'fixed' (+25 / -15 / +5)
+    ELO_K_FACTOR=(float, 32.0), # Largest Elo change from one game
+    GLICKO2_TAU=(float, 0.5), # Glicko-2 volatility constraint; 0.3-1.2, smaller is steadier
 )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -189,6 +213,8 @@ REST_FRAMEWORK = {
         "anon": env("ANON_THROTTLE_LIMIT"),
     },
     "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+    # Listings ordered by creation time page by cursor; rank-ordered ones set CustomPagination
+    "DEFAULT_PAGINATION_CLASS": "utils.custom_pagination.KeysetPagination",
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
@@ -198,17 +224,65 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=env("JWT_REFRESH_TOKEN_LIFETIME")),
     "ROTATE_REFRESH_TOKENS": env("ROTATE_REFRESH_TOKEN"),
     "BLACKLIST_AFTER_ROTATION": env("BLACKLIST_AFTER_ROTATION"),
+    # Tokens carry the username and bot flag, so sockets authenticate without a user query
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.serializers.token_serializer.PrincipalTokenObtainPairSerializer",
+}
+
+# Seconds a socket principal resolved from the users table is cached (how long a deactivated user can still connect)
+WS_PRINCIPAL_CACHE_TTL = env("WS_PRINCIPAL_CACHE_TTL")
+
+REDIS_URL = env('REDIS_URL')
+
+# Shared cache (metrics, counters); use a redis:// URL when running several processes
+CACHES = {
+    'default': env.cache_url('CACHE_URL'),
 }
 
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [env('REDIS_URL')],
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# Bot opponent used as a matchmaking fallback
+BOT_USERNAME = env("BOT_USERNAME")
+BOT_MATCHMAKING_TIMEOUT = env("BOT_MATCHMAKING_TIMEOUT")
+
+# Matchmaking queue backend (game/matchmaking.py)
+MATCHMAKING_BACKEND = env("MATCHMAKING_BACKEND")
+MATCHMAKING_BUCKET_SIZE = env("MATCHMAKING_BUCKET_SIZE")
+MATCHMAKING_INITIAL_GAP = env("MATCHMAKING_INITIAL_GAP")
+MATCHMAKING_GAP_GROWTH = env("MATCHMAKING_GAP_GROWTH")
+MATCHMAKING_MAX_GAP = env("MATCHMAKING_MAX_GAP")
+MATCHMAKING_PASS_INTERVAL = env("MATCHMAKING_PASS_INTERVAL")
+
+# Listing totals (utils/custom_pagination.py)
+PAGINATION_COUNT_TTL = env("PAGINATION_COUNT_TTL")
+PAGINATION_ESTIMATE_THRESHOLD = env("PAGINATION_ESTIMATE_THRESHOLD")
+
+# Leaderboard backend (accounts/leaderboard.py)
+LEADERBOARD_BACKEND = env("LEADERBOARD_BACKEND")
+
+# Player rating engine (game/ratings.py)
+RATING_ENGINE = env("RATING_ENGINE")
+ELO_K_FACTOR = env("ELO_K_FACTOR")
+GLICKO2_TAU = env("GLICKO2_TAU")
+
+# Game ownership across ASGI workers (game/ownership.py, game/actors.py)
+GAME_WORKER_ID = env("GAME_WORKER_ID")
+GAME_WORKERS = env("GAME_WORKERS")
+
+# In-memory live game state with write-behind persistence (game/state_store.py)
+GAME_FLUSH_INTERVAL = env("GAME_FLUSH_INTERVAL")
+GAME_FLUSH_BATCH_SIZE = env("GAME_FLUSH_BATCH_SIZE")
+GAME_IDLE_TIMEOUT = env("GAME_IDLE_TIMEOUT")
+GAME_EVENT_LOG_SIZE = env("GAME_EVENT_LOG_SIZE")
+GAME_AUDIT_MOVES = env("GAME_AUDIT_MOVES")
+GAME_FLUSH_MAX_ATTEMPTS = env("GAME_FLUSH_MAX_ATTEMPTS")
+
 # CORS Settings
 # 🚀 FIX: Using plural "CORS_ALLOWED_ORIGINS" to match the variable name defined at the top
 CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS")
@@ -0,0 +1,51 @@
+"""Conditional GET helpers: cached validator tokens answer polls with 304 before any database query."""
+import hashlib
+import uuid
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+# Validator tokens outlive any client poll; a lost token only costs one full response
+TOKEN_TIMEOUT = 24 * 60 * 60
+
+
+def new_token():
+    return uuid.uuid4().hex
+
+
+def get_token(key):
+    """Current token for a cache key, created if missing"""
+    token = cache.get(key)
+    if token is None:
+        # add, not set: a writer may have just replaced the token
+        cache.add(key, new_token(), TOKEN_TIMEOUT)
+        token = cache.get(key)
+    return token
+
+
+def rotate_tokens(*keys):
+    """Mark the resources behind cache keys as changed"""
+    token = new_token()
+    cache.set_many({key: token for key in keys}, TOKEN_TIMEOUT)
+
+
+def weak_etag(*parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def add_validators(response, etag):
+    """Set the ETag, and make clients revalidate before reusing the response"""
+    if response.status_code >= 400:
+        return response
+    # No Last-Modified: a date has one-second resolution, so a same-second change would be missed
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(request, etag):
+    """A 304 (or 412) response if the request's If-None-Match / If-Match decide it, else None"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return None
+    return add_validators(response, etag)
@@ -1,13 +1,175 @@
 # users/pagination.py
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+import uuid
+from base64 import b64decode, b64encode
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimated_count(queryset):
+    """
+    PostgreSQL's row estimate for a queryset, or None on other databases.
+
+    An unfiltered queryset reads the table's pg_class.reltuples; a filtered
+    one asks the planner (EXPLAIN) how many rows it expects. Neither scans
+    the table, and both are only as fresh as the last ANALYZE.
+    """
+    query = queryset.query
+    if connections[queryset.db].vendor != 'postgresql' or query.is_sliced or query.distinct:
+        return None
+    with connections[queryset.db].cursor() as cursor:
+        if not query.where:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table]
+            )
+            estimate = cursor.fetchone()[0]
+        else:
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]['Plan']['Plan Rows']
+    # reltuples is -1 for a table that has never been analyzed
+    return int(estimate) if estimate >= 0 else None
+
+
+def paginated_count(queryset):
+    """
+    Row count of a queryset for pagination metadata.
+
+    Counts are cached for PAGINATION_COUNT_TTL seconds, keyed on the SQL, so
+    paging through a listing runs one COUNT(*) rather than one per page. On
+    PostgreSQL a planner estimate of at least PAGINATION_ESTIMATE_THRESHOLD
+    rows is used as is: at that size an exact count costs a scan and the
+    last few digits of the total are noise to a client.
+    """
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    ttl = settings.PAGINATION_COUNT_TTL
+    key = 'pagination:count:' + hashlib.md5(f'{queryset.db}|{sql}|{params}'.encode()).hexdigest()
+    if ttl:
+        count = cache.get(key)
+        if count is not None:
+            return count
+
+    count = None
+    threshold = settings.PAGINATION_ESTIMATE_THRESHOLD
+    if threshold:
+        estimate = estimated_count(queryset)
+        if estimate is not None and estimate >= threshold:
+            count = estimate
+    if count is None:
+        count = queryset.count()
+    if ttl:
+        cache.set(key, count, ttl)
+    return count
+
+
+class CountingPaginator(Paginator):
+    """Paginator whose queryset counts go through paginated_count"""
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return paginated_count(self.object_list)
+        return super().count
+
 
 class CustomPagination(PageNumberPagination):
+    """
+    Page number pagination with cheap counts, for rank-ordered listings.
+
+    Totals come from paginated_count (cached, estimated on large tables).
+    With ?count=false no total is computed at all and the response only
+    carries next / previous links. Object lists offering cursor(row) and
+    after(cursor, limit) (the leaderboard) are then paged by cursor, so deep
+    pages cost no OFFSET scan; other lists read one extra row to tell
+    whether a next page exists. Listings ordered by creation time use
+    KeysetPagination instead.
+    """
+    django_paginator_class = CountingPaginator
     page_size = 10  # default number of records per page
     page_size_query_param = 'page_size'  # allow clients to set ?page_size=
     max_page_size = 100  # limit max page size
+    count_query_param = 'count'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.counted = request.query_params.get(self.count_query_param) not in ('false', '0')
+        if self.counted:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.object_list = queryset
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor and hasattr(queryset, 'after'):
+            self.page_number = None
+            try:
+                rows = list(queryset.after(cursor, page_size + 1))
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        else:
+            page_number = request.query_params.get(self.page_query_param) or 1
+            try:
+                self.page_number = int(page_number)
+                if self.page_number < 1:
+                    raise ValueError
+            except ValueError:
+                raise NotFound(self.invalid_page_message.format(
+                    page_number=page_number, message='That page number is not a valid integer'
+                ))
+            offset = (self.page_number - 1) * page_size
+            rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.rows = rows[:page_size]
+        return self.rows
+
+    def get_next_link(self):
+        if self.counted:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        if hasattr(self.object_list, 'cursor'):
+            url = remove_query_param(url, self.page_query_param)
+            return replace_query_param(url, self.cursor_query_param, self.object_list.cursor(self.rows[-1]))
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.counted:
+            return super().get_previous_link()
+        # Cursor pages only link forwards
+        if self.page_number in (None, 1):
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
 
     def get_paginated_response(self, data):
+        if not self.counted:
+            return Response({
+                'current_page': self.page_number,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data
+            })
         return Response({
             'count': self.page.paginator.count,
             'total_pages': self.page.paginator.num_pages,
@@ -16,3 +178,80 @@ class CustomPagination(PageNumberPagination):
             'previous': self.get_previous_link(),
             'results': data
         })
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, id), newest first.
+
+    Each page is an index range scan that starts right after the previous
+    page's last row, so page N costs the same as page 1 however many rows
+    precede it. The queryset may also be a list of disjoint querysets (for
+    example a user's games as player 1 and as player 2): each is paged on
+    its own and the pages are merged, so every branch can use its own index.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        rows = []
+        for branch in queryset if isinstance(queryset, (list, tuple)) else [queryset]:
+            if position:
+                created_at, pk = position
+                branch = branch.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+            rows.extend(branch.order_by('-created_at', '-pk')[:self.page_size + 1])
+        rows.sort(key=lambda row: (row.created_at, row.pk), reverse=True)
+
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk = b64decode(encoded.encode(), altchars=b'-_').decode().split('|')
+            return datetime.fromisoformat(created_at), uuid.UUID(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        position = f'{row.created_at.isoformat()}|{row.pk}'
+        return b64encode(position.encode(), altchars=b'-_').decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
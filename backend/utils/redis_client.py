@@ -0,0 +1,10 @@
+# utils/redis_client.py
+from functools import lru_cache
+from django.conf import settings
+import redis
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """Shared Redis client for REDIS_URL (connections are pooled by the client)"""
+    return redis.Redis.from_url(settings.REDIS_URL)